@@ -0,0 +1,401 @@
+import os
+import sys
+import ast
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+import multiprocessing
+
+# Benchmarks for the API's local hot paths. Run from the api folder, e.g.:
+#   python benchmarks.py ltm --workers 8 --writes 500
+
+
+# ----- Long-term memory concurrent writes -----
+def _ltm_legacy_writer(db_path: str, worker: int, writes: int):
+    """Mimics crewai's LTMSQLiteStorage: a new connection and a commit per save, rollback journal."""
+    for i in range(writes):
+        while True:
+            try:
+                with sqlite3.connect(db_path) as conn:
+                    conn.execute(
+                        "INSERT INTO long_term_memories (task_description, metadata, datetime, score) VALUES (?, ?, ?, ?)",
+                        (f"task {i % 20}", json.dumps({"worker": worker, "i": i}), str(time.time()), 5.0),
+                    )
+                break
+            except sqlite3.OperationalError:
+                time.sleep(0.001)
+        if i % 10 == 0:
+            with sqlite3.connect(db_path) as conn:
+                conn.execute(
+                    "SELECT metadata, datetime, score FROM long_term_memories WHERE task_description = ? "
+                    "ORDER BY datetime DESC, score ASC LIMIT 3",
+                    (f"task {i % 20}",),
+                ).fetchall()
+
+
+def _ltm_managed_writer(db_path: str, worker: int, writes: int):
+    from ltm_storage import ManagedLTMStorage, flush_all
+    storage = ManagedLTMStorage(namespace=f"user-{worker}", db_path=db_path)
+    for i in range(writes):
+        storage.save(f"task {i % 20}", {"worker": worker, "i": i}, str(time.time()), 5.0)
+        if i % 10 == 0:
+            storage.load(f"task {i % 20}", 3)
+    flush_all()
+
+
+def _run_writers(target, db_path: str, workers: int, writes: int) -> float:
+    processes = [multiprocessing.Process(target=target, args=(db_path, w, writes)) for w in range(workers)]
+    start = time.perf_counter()
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    return time.perf_counter() - start
+
+
+def bench_ltm(workers: int, writes: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.db")
+        with sqlite3.connect(legacy_path) as conn:
+            conn.execute(
+                "CREATE TABLE long_term_memories (id INTEGER PRIMARY KEY AUTOINCREMENT, task_description TEXT, "
+                "metadata TEXT, datetime TEXT, score REAL)"
+            )
+        legacy = _run_writers(_ltm_legacy_writer, legacy_path, workers, writes)
+
+        managed_path = os.path.join(tmp, "managed.db")
+        managed = _run_writers(_ltm_managed_writer, managed_path, workers, writes)
+        with sqlite3.connect(managed_path) as conn:
+            rows = conn.execute("SELECT COUNT(*) FROM long_term_memories").fetchone()[0]
+
+    total = workers * writes
+    print(f"Long-term memory: {workers} processes x {writes} writes (1 read per 10 writes)")
+    print(f"  legacy  : {legacy:.2f}s  ({total / legacy:,.0f} writes/s)")
+    print(f"  managed : {managed:.2f}s  ({total / managed:,.0f} writes/s), {rows} rows persisted")
+
+
+# ----- Prompt size before/after context assembly -----
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+RAG_TEST_NOTEBOOK = os.path.join(API_DIR, "..", "misc", "rag_test.ipynb")
+# The recipes Qdrant returned for each sample input in misc/rag_test.ipynb (top 5, as the notebook searched)
+RAG_TEST_RECIPES = os.path.join(API_DIR, "data", "rag_test_recipes.json")
+
+
+def load_sample_inputs(notebook_path: str = RAG_TEST_NOTEBOOK) -> dict:
+    """Load the `inputs` dict of sample user inputs from misc/rag_test.ipynb."""
+    with open(notebook_path, "r", encoding="utf-8") as f:
+        notebook = json.load(f)
+    for cell in notebook["cells"]:
+        source = "".join(cell["source"])
+        if cell["cell_type"] == "code" and source.lstrip().startswith("inputs = {"):
+            return ast.literal_eval(source.split("=", 1)[1].strip())
+    raise ValueError("No sample inputs found in the notebook")
+
+
+def load_prompt_literals(names=("role", "goal", "backstory", "output_format")) -> dict:
+    """Read the raw prompt string literals defined in main.py without importing it."""
+    with open(os.path.join(API_DIR, "main.py"), "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    literals = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id in names:
+                    literals[target.id] = node.value.value
+    return literals
+
+
+def retrieve_payloads(query: str, limit: int) -> list:
+    from sentence_transformers import SentenceTransformer
+    from qdrant_client import QdrantClient
+    model = SentenceTransformer('all-MiniLM-L6-v2')
+    qdrant = QdrantClient(url=os.environ.get("QDRANT_URL"), api_key=os.environ.get("QDRANT_API_KEY"))
+    results = qdrant.search(collection_name="recipe_data", query_vector=model.encode(query).tolist(), limit=limit)
+    return [result.payload for result in results]
+
+
+def bench_context(recipes_path: str = None):
+    from context_assembly import count_tokens, compact_prompt, assemble_recipe_context, RECIPE_SEARCH_LIMIT
+
+    literals = load_prompt_literals()
+    static_before = sum(count_tokens(text) for text in literals.values())
+    static_after = sum(count_tokens(compact_prompt(text)) for text in literals.values())
+    print(f"Agent prompt (role + goal + backstory + output_format): {static_before} -> {static_after} tokens")
+
+    fixed_payloads = None
+    if recipes_path or not os.environ.get("QDRANT_URL"):
+        # A list of payloads for every input, or a dict of payloads per input name
+        recipes_path = recipes_path or RAG_TEST_RECIPES
+        print(f"Recipes from {os.path.relpath(recipes_path)} (set QDRANT_URL/QDRANT_API_KEY to retrieve them)")
+        with open(recipes_path, "r", encoding="utf-8") as f:
+            fixed_payloads = json.load(f)
+
+    print(f"{'input':<8} {'recipes before':>15} {'recipes after':>14} {'prompt before':>14} {'prompt after':>13}")
+    totals = [0, 0]
+    for name, user_input in load_sample_inputs().items():
+        if isinstance(fixed_payloads, dict):
+            payloads = fixed_payloads[name]
+        elif fixed_payloads is not None:
+            payloads = fixed_payloads
+        else:
+            payloads = retrieve_payloads(user_input, RECIPE_SEARCH_LIMIT * 2)
+        legacy_context = "Retrieved recipes:\n\n".join(str(payload) for payload in payloads[:RECIPE_SEARCH_LIMIT])
+        context = assemble_recipe_context(payloads)
+        before = count_tokens(legacy_context)
+        after = count_tokens(context)
+        input_tokens = count_tokens(user_input)
+        print(f"{name:<8} {before:>15} {after:>14} {static_before + input_tokens + before:>14} "
+              f"{static_after + input_tokens + after:>13}")
+        totals[0] += static_before + input_tokens + before
+        totals[1] += static_after + input_tokens + after
+    print(f"Prompt tokens over all inputs: {totals[0]} -> {totals[1]} ({1 - totals[1] / totals[0]:.0%} fewer)")
+
+
+# ----- API latency under embedding load -----
+def _percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def bench_embedding(backend: str, threads: int, seconds: float):
+    """Measure a pure-Python request-handling task while `threads` threads keep encoding queries."""
+    import threading
+    if backend == "service":
+        from embedding_service import EmbeddingClient
+        model = EmbeddingClient()
+    else:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer('all-MiniLM-L6-v2', device="cpu")
+
+    queries = list(load_sample_inputs().values())
+    model.encode(queries[0])
+    stop = threading.Event()
+    encoded = [0] * threads
+
+    def load(index: int):
+        while not stop.is_set():
+            model.encode(queries[encoded[index] % len(queries)])
+            encoded[index] += 1
+
+    # Stand-in for request handling: parsing and serialising a typical tracker payload
+    payload = [{"meal_name": "Lunch", "food_name": f"food {i}", "calories": i, "proteins": i} for i in range(200)]
+
+    def handle_request() -> float:
+        start = time.perf_counter()
+        json.loads(json.dumps(payload))
+        return (time.perf_counter() - start) * 1000
+
+    idle = [handle_request() for _ in range(200)]
+    workers = [threading.Thread(target=load, args=(i,), daemon=True) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    loaded = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        loaded.append(handle_request())
+        time.sleep(0.005)
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    print(f"Embedding backend '{backend}': {threads} encoding threads for {seconds:.0f}s, "
+          f"{sum(encoded) / seconds:,.0f} queries/s")
+    print(f"  request handling idle   : p50 {_percentile(idle, 0.5):.2f}ms  p95 {_percentile(idle, 0.95):.2f}ms")
+    print(f"  request handling loaded : p50 {_percentile(loaded, 0.5):.2f}ms  p95 {_percentile(loaded, 0.95):.2f}ms")
+
+
+# ----- Query encoder: torch vs int8 ONNX -----
+def _rss_mb() -> float:
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _encoder_stats(backend: str, queries: list, repeats: int, results):
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    if backend == "onnx":
+        from onnx_encoder import OnnxEncoder
+        model = OnnxEncoder()
+    else:
+        import torch
+        from sentence_transformers import SentenceTransformer
+        torch.set_num_threads(1)
+        model = SentenceTransformer('all-MiniLM-L6-v2', device="cpu")
+    load_seconds = time.perf_counter() - start
+    model.encode(queries[0])
+
+    latencies = []
+    for _ in range(repeats):
+        for query in queries:
+            start = time.perf_counter()
+            model.encode(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model.encode(queries)
+    batch_seconds = time.perf_counter() - start
+
+    results.put({
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "rss_mb": _rss_mb() - rss_before,
+        "p50_ms": _percentile(latencies, 0.5),
+        "p95_ms": _percentile(latencies, 0.95),
+        "throughput": repeats * len(queries) / batch_seconds,
+    })
+
+
+def bench_encoders(repeats: int):
+    """Compare import+load time, RSS, single-query latency and batch throughput of both encoders."""
+    context = multiprocessing.get_context("spawn")
+    queries = list(load_sample_inputs().values())
+    print(f"{'backend':<8} {'load s':>7} {'RSS MB':>7} {'p50 ms':>7} {'p95 ms':>7} {'queries/s':>10}")
+    for backend in ("torch", "onnx"):
+        # A fresh process per backend, so import time and memory are not shared between them
+        results = context.Queue()
+        process = context.Process(target=_encoder_stats, args=(backend, queries, repeats, results))
+        process.start()
+        stats = results.get()
+        process.join()
+        print(f"{stats['backend']:<8} {stats['load_seconds']:>7.2f} {stats['rss_mb']:>7.0f} {stats['p50_ms']:>7.2f} "
+              f"{stats['p95_ms']:>7.2f} {stats['throughput']:>10.0f}")
+
+
+# ----- Memory per web worker -----
+def _children(pid: int) -> list:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # The command name may contain spaces, the parent pid is the second field after it
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if parent == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def _memory_kb(pid: int) -> dict:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def bench_worker_memory(master_pid: int):
+    """Report RSS, PSS and shared/private memory of a running `python serve.py` master and its workers (Linux)."""
+    print(f"{'process':<16} {'RSS MB':>8} {'PSS MB':>8} {'shared MB':>10} {'private MB':>11}")
+    total_pss = 0
+    for label, pid in [("master", master_pid)] + [(f"worker {pid}", pid) for pid in _children(master_pid)]:
+        memory = _memory_kb(pid)
+        total_pss += memory["pss"]
+        print(f"{label:<16} {memory['rss'] / 1024:>8.0f} {memory['pss'] / 1024:>8.0f} "
+              f"{memory['shared'] / 1024:>10.0f} {memory['private'] / 1024:>11.0f}")
+    print(f"Total PSS (actual memory used by the server): {total_pss / 1024:.0f} MB")
+
+
+# ----- Long-range nutrition analytics -----
+def _synthetic_macros(days: int, entries_per_day: int) -> list:
+    import random
+    from datetime import date, timedelta
+    rng = random.Random(0)
+    meals = ["Breakfast", "Lunch", "Dinner", "Snack"]
+    end = date.today()
+    rows = []
+    for offset in range(days):
+        day = (end - timedelta(days=offset)).isoformat()
+        # Roughly one day in ten is not logged at all
+        if rng.random() < 0.1:
+            continue
+        for i in range(entries_per_day):
+            rows.append({
+                "id": len(rows) + 1, "date_added": day, "meal_name": meals[i % len(meals)],
+                "calories": rng.randint(100, 900), "proteins": rng.randint(5, 60),
+                "carbs": rng.randint(5, 120), "fats": rng.randint(2, 40),
+            })
+    return rows
+
+
+def bench_analytics(days: int, entries_per_day: int, repeats: int):
+    """Time the columnar conversion and the rollups of /get-user-macro-analytics on synthetic rows."""
+    from datetime import date, timedelta
+    from nutrition_analytics import MacroColumns, analyze, ANALYTICS_WINDOWS
+
+    end = date.today()
+    start = end - timedelta(days=days - 1)
+    rows = _synthetic_macros(days + max(ANALYTICS_WINDOWS) - 1, entries_per_day)
+    build, compute = [], []
+    for _ in range(repeats):
+        began = time.perf_counter()
+        columns = MacroColumns(rows)
+        built = time.perf_counter()
+        analyze(columns, start, end, ANALYTICS_WINDOWS, protein_target=120)
+        build.append((built - began) * 1000)
+        compute.append((time.perf_counter() - built) * 1000)
+    print(f"{len(rows)} entries, {days} days, windows {ANALYTICS_WINDOWS}")
+    print(f"{'stage':<10} {'p50 ms':>8} {'p95 ms':>8}")
+    for label, timings in [("columns", build), ("rollups", compute)]:
+        print(f"{label:<10} {_percentile(timings, 0.5):>8.2f} {_percentile(timings, 0.95):>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the meal planner API")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    ltm_parser = subparsers.add_parser("ltm", help="Concurrent writes to the long-term memory store")
+    ltm_parser.add_argument("--workers", type=int, default=8)
+    ltm_parser.add_argument("--writes", type=int, default=500)
+
+    context_parser = subparsers.add_parser("context", help="Prompt size before/after context assembly")
+    context_parser.add_argument("--recipes", help="JSON list of recipe payloads, or payloads per input name, to use "
+                                                  "instead of querying Qdrant (default without Qdrant: data/rag_test_recipes.json)")
+
+    embedding_parser = subparsers.add_parser("embedding", help="Request latency under embedding load")
+    embedding_parser.add_argument("--backend", choices=["local", "service"], default="local",
+                                  help="'service' needs `python embedding_service.py` running")
+    embedding_parser.add_argument("--threads", type=int, default=4)
+    embedding_parser.add_argument("--seconds", type=float, default=10)
+
+    encoders_parser = subparsers.add_parser("encoders", help="torch vs int8 ONNX query encoder")
+    encoders_parser.add_argument("--repeats", type=int, default=20)
+
+    workers_parser = subparsers.add_parser("workers", help="Memory per worker of a running production server")
+    workers_parser.add_argument("--pid", type=int, required=True, help="PID of the `python serve.py` master process")
+
+    analytics_parser = subparsers.add_parser("analytics", help="Long-range macro analytics over synthetic history")
+    analytics_parser.add_argument("--days", type=int, default=365)
+    analytics_parser.add_argument("--entries-per-day", type=int, default=12)
+    analytics_parser.add_argument("--repeats", type=int, default=50)
+
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    if args.benchmark == "ltm":
+        bench_ltm(args.workers, args.writes)
+    elif args.benchmark == "context":
+        bench_context(args.recipes)
+    elif args.benchmark == "embedding":
+        bench_embedding(args.backend, args.threads, args.seconds)
+    elif args.benchmark == "encoders":
+        bench_encoders(args.repeats)
+    elif args.benchmark == "workers":
+        bench_worker_memory(args.pid)
+    elif args.benchmark == "analytics":
+        bench_analytics(args.days, args.entries_per_day, args.repeats)
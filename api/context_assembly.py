@@ -0,0 +1,120 @@
+import os
+import re
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Token budget of the recipe context handed to the agent by the vector search tool
+RECIPE_CONTEXT_TOKEN_BUDGET = int(os.environ.get("RECIPE_CONTEXT_TOKEN_BUDGET", 1200))
+# Characters of directions kept per recipe; ingredients matter more than the method
+RECIPE_DIRECTIONS_MAX_CHARS = int(os.environ.get("RECIPE_DIRECTIONS_MAX_CHARS", 300))
+# Recipes kept in the context after de-duplication
+RECIPE_SEARCH_LIMIT = int(os.environ.get("RECIPE_SEARCH_LIMIT", 5))
+RECIPE_FIELDS = ("title", "ingredients", "directions")
+
+# tiktoken ships with crewai; fall back to a ~4 characters per token estimate without it
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count (or estimate) the tokens of a piece of text."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def compact_prompt(text: str) -> str:
+    """Strip the indentation and blank-line padding that the prompt literals carry."""
+    lines = [line.strip() for line in text.strip().splitlines()]
+    compacted = []
+    for line in lines:
+        if line or (compacted and compacted[-1]):
+            compacted.append(line)
+    return "\n".join(compacted)
+
+
+def _normalize_title(title: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", title.lower()).strip()
+
+
+def project_recipe(payload: Dict[str, Any]) -> Dict[str, str]:
+    """Keep only the recipe fields the meal planner uses, with the directions shortened."""
+    recipe = {field: str(payload.get(field, "")).strip() for field in RECIPE_FIELDS}
+    if len(recipe["directions"]) > RECIPE_DIRECTIONS_MAX_CHARS:
+        recipe["directions"] = recipe["directions"][:RECIPE_DIRECTIONS_MAX_CHARS].rsplit(" ", 1)[0] + "..."
+    return recipe
+
+
+def format_recipe(recipe: Dict[str, str]) -> str:
+    lines = [f"Title: {recipe['title']}", f"Ingredients: {recipe['ingredients']}"]
+    if recipe["directions"]:
+        lines.append(f"Directions: {recipe['directions']}")
+    return "\n".join(lines)
+
+
+def assemble_recipe_context(payloads: Iterable[Dict[str, Any]], token_budget: Optional[int] = None,
+                            max_recipes: Optional[int] = None) -> str:
+    """Project, de-duplicate and budget retrieved recipe payloads into the agent's context."""
+    token_budget = token_budget or RECIPE_CONTEXT_TOKEN_BUDGET
+    max_recipes = max_recipes or RECIPE_SEARCH_LIMIT
+    seen = set()
+    blocks = []
+    used = 0
+    for payload in payloads:
+        if len(blocks) >= max_recipes:
+            break
+        recipe = project_recipe(payload)
+        key = _normalize_title(recipe["title"]) or _normalize_title(recipe["ingredients"])
+        if key in seen:
+            continue
+        seen.add(key)
+
+        block = format_recipe(recipe)
+        tokens = count_tokens(block)
+        if used + tokens > token_budget:
+            # Try again without the directions before giving up on this recipe
+            recipe["directions"] = ""
+            block = format_recipe(recipe)
+            tokens = count_tokens(block)
+            if used + tokens > token_budget:
+                continue
+        blocks.append(block)
+        used += tokens
+
+    if not blocks:
+        return "No recipes retrieved."
+    return "Retrieved recipes:\n\n" + "\n\n".join(blocks)
+
+
+# ----- Per-request token accounting -----
+request_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar("request_usage", default=None)
+# Crew runs of one request can finish concurrently on different threads
+_usage_lock = threading.Lock()
+
+
+def start_usage() -> Dict[str, int]:
+    """Start accounting the token usage of the current request."""
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "successful_requests": 0}
+    request_usage.set(usage)
+    return usage
+
+
+def record_usage(crew_output: Any):
+    """Add the token usage of a finished crew run to the current request."""
+    usage = request_usage.get()
+    metrics = getattr(crew_output, "token_usage", None)
+    if usage is None or metrics is None:
+        return
+    with _usage_lock:
+        for field in usage:
+            usage[field] += int(getattr(metrics, field, 0) or 0)
+
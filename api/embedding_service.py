@@ -0,0 +1,191 @@
+import os
+import gc
+import sys
+import json
+import socket
+import struct
+import signal
+import logging
+from typing import List, Union
+
+import numpy as np
+
+# Out-of-process embedding inference. The sidecar loads the model once, then forks a pool of
+# worker processes that all accept on the same Unix socket:
+#   python embedding_service.py
+# The API talks to it through EmbeddingClient when EMBEDDING_BACKEND=service. Requests are a
+# length-prefixed JSON list of texts; vectors come back as raw float32 bytes, not JSON.
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_SOCKET = os.environ.get("EMBEDDING_SOCKET", "/tmp/nutrigenius-embedding.sock")
+EMBEDDING_WORKERS = int(os.environ.get("EMBEDDING_WORKERS", os.cpu_count() or 1))
+EMBEDDING_TIMEOUT = float(os.environ.get("EMBEDDING_TIMEOUT", 30))
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+# "torch" serves the sentence-transformers model, "onnx" the int8 export from onnx_encoder.py
+EMBEDDING_RUNTIME = os.environ.get("EMBEDDING_RUNTIME", "torch")
+
+# Request:  uint32 length | JSON list of texts
+# Response: uint32 status | uint32 rows | uint32 dim | rows * dim float32 (status 0)
+#           uint32 status | uint32 length | UTF-8 error message            (status 1)
+HEADER = struct.Struct("!I")
+SHAPE = struct.Struct("!II")
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+
+def _recv_exact(conn: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = conn.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ConnectionError("Embedding service connection closed")
+        received += count
+    return bytes(buffer)
+
+
+class EmbeddingClient:
+    """Drop-in replacement for the model's encode() that calls the embedding sidecar."""
+
+    def __init__(self, socket_path: str = EMBEDDING_SOCKET, timeout: float = EMBEDDING_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _request(self, texts: List[str]) -> np.ndarray:
+        payload = json.dumps(texts).encode("utf-8")
+        # One request per connection: Unix socket connects are cheap, and no worker gets pinned to an idle client
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(self.timeout)
+            conn.connect(self.socket_path)
+            conn.sendall(HEADER.pack(len(payload)) + payload)
+            (status,) = HEADER.unpack(_recv_exact(conn, HEADER.size))
+            if status != STATUS_OK:
+                (length,) = HEADER.unpack(_recv_exact(conn, HEADER.size))
+                message = _recv_exact(conn, length).decode("utf-8", "replace")
+                raise RuntimeError(f"Embedding service error: {message}")
+            rows, dim = SHAPE.unpack(_recv_exact(conn, SHAPE.size))
+            data = _recv_exact(conn, rows * dim * 4)
+        return np.frombuffer(data, dtype=np.float32).reshape(rows, dim)
+
+    def encode(self, sentences: Union[str, List[str]]) -> np.ndarray:
+        single = isinstance(sentences, str)
+        vectors = self._request([sentences] if single else list(sentences))
+        return vectors[0] if single else vectors
+
+
+def _send_error(conn: socket.socket, message: str):
+    data = message.encode("utf-8")
+    try:
+        conn.sendall(HEADER.pack(STATUS_ERROR) + HEADER.pack(len(data)) + data)
+    except OSError as e:
+        logger.warning(f"Could not send embedding error reply: {str(e)}")
+
+
+def _serve_connection(conn: socket.socket, model):
+    with conn:
+        try:
+            (length,) = HEADER.unpack(_recv_exact(conn, HEADER.size))
+            texts = json.loads(_recv_exact(conn, length).decode("utf-8"))
+        except (OSError, ConnectionError, ValueError) as e:
+            logger.error(f"Error reading embedding request: {str(e)}")
+            return
+        try:
+            vectors = np.ascontiguousarray(model.encode(texts), dtype=np.float32)
+            if vectors.ndim == 1:
+                vectors = vectors.reshape(1, -1)
+        except Exception as e:
+            logger.error(f"Error encoding texts: {str(e)}")
+            _send_error(conn, str(e))
+            return
+        try:
+            conn.sendall(HEADER.pack(STATUS_OK) + SHAPE.pack(*vectors.shape) + vectors.tobytes())
+        except OSError as e:
+            # The client gave up (timeout or crash) before the reply; nothing left to do for it
+            logger.warning(f"Could not send embeddings, client disconnected: {str(e)}")
+
+
+def _worker_loop(server: socket.socket, model):
+    signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(1)
+    while True:
+        try:
+            conn, _ = server.accept()
+        except OSError as e:
+            logger.error(f"Error accepting embedding connection: {str(e)}")
+            continue
+        # Each worker serves one request at a time; the other workers keep accepting
+        try:
+            _serve_connection(conn, model)
+        except Exception as e:
+            logger.error(f"Error serving embedding request: {str(e)}")
+
+
+def load_model():
+    if EMBEDDING_RUNTIME == "onnx":
+        from onnx_encoder import OnnxEncoder
+        return OnnxEncoder()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+
+
+def serve(socket_path: str = EMBEDDING_SOCKET, workers: int = EMBEDDING_WORKERS, model=None):
+    """Load the model once, bind the socket and fork the worker pool."""
+    model = model or load_model()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(128)
+    gc.freeze()
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _worker_loop(server, model)
+            finally:
+                os._exit(1)
+        children.add(pid)
+
+    for _ in range(workers):
+        spawn()
+    logger.info(f"Embedding service listening on {socket_path} with {workers} workers")
+
+    def shutdown(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    try:
+        while children:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            children.discard(pid)
+            if not stopping:
+                # A worker died outside a shutdown; replace it so the pool never drains
+                logger.warning(f"Embedding worker {pid} exited with status {status}, respawning")
+                spawn()
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    serve()
@@ -0,0 +1,167 @@
+import re
+import json
+from typing import Iterable, Iterator, Optional, Tuple
+
+from pydantic import AliasChoices, BaseModel, Field, ValidationError, field_validator
+
+# Parsing layer for LLM replies that should contain a JSON object: finds the first balanced object
+# (also in a streamed reply, as soon as it closes) and validates it against a typed schema.
+
+NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def coerce_number(value) -> float:
+    """Read a number out of values such as 25, "25", "25g", "~25 kcal", "1,200" or "20-30" (the midpoint)."""
+    if isinstance(value, bool):
+        raise ValueError("expected a number")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict) and "value" in value:
+        return coerce_number(value["value"])
+    if isinstance(value, str):
+        numbers = [float(number) for number in NUMBER_RE.findall(value.replace(",", ""))]
+        if len(numbers) == 1:
+            return numbers[0]
+        if len(numbers) == 2 and re.search(r"\d\s*(?:-|–|to)\s*\d", value):
+            return sum(numbers) / 2
+    raise ValueError(f"expected a number, got {value!r}")
+
+
+class MacrosEstimate(BaseModel):
+    """Macros of one food item as returned by the vision model: kcal and grams, whole numbers."""
+
+    calories: int = Field(ge=0, le=10000)
+    protein: int = Field(ge=0, le=2000, validation_alias=AliasChoices("protein", "proteins"))
+    fats: int = Field(ge=0, le=2000, validation_alias=AliasChoices("fats", "fat"))
+    carbs: int = Field(ge=0, le=2000, validation_alias=AliasChoices("carbs", "carbohydrates"))
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def _coerce(cls, value):
+        return round(coerce_number(value))
+
+
+class ParseError(ValueError):
+    """The reply had no usable JSON object. `reason` is "no_object" or "schema", `text` the reply."""
+
+    def __init__(self, reason: str, detail: str, text: str):
+        super().__init__(f"{reason}: {detail}")
+        self.reason = reason
+        self.detail = detail
+        self.text = text
+
+
+class JsonObjectScanner:
+    """Finds the first balanced JSON object in text that arrives in pieces."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self._reset()
+
+    def _reset(self):
+        self.start = None
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, chunk: str) -> Optional[dict]:
+        """Add text; returns the object as soon as its closing brace arrives."""
+        self.buffer += chunk
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+            self.position += 1
+            if self.start is None:
+                if char == "{":
+                    self.start, self.depth = self.position - 1, 1
+            elif self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    candidate = self.buffer[self.start:self.position]
+                    try:
+                        return json.loads(candidate)
+                    except ValueError:
+                        # Braces that weren't JSON, e.g. "{value in grams}": look for an object inside them
+                        self.position = self.start + 1
+                        self._reset()
+        return None
+
+    def finish(self) -> Optional[dict]:
+        """At the end of the text, retry after an opening brace that was never closed."""
+        while self.start is not None:
+            self.position = self.start + 1
+            self._reset()
+            found = self.feed("")
+            if found is not None:
+                return found
+        return None
+
+
+def _validate(obj: Optional[dict], text: str, schema) -> BaseModel:
+    if obj is None:
+        raise ParseError("no_object", "the reply contained no JSON object", text)
+    try:
+        return schema.model_validate(obj)
+    except ValidationError as e:
+        detail = "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors())
+        raise ParseError("schema", detail, text)
+
+
+def parse_object(text: str, schema=MacrosEstimate) -> BaseModel:
+    """Validate the first JSON object of a complete reply."""
+    scanner = JsonObjectScanner()
+    obj = scanner.feed(text)
+    if obj is None:
+        obj = scanner.finish()
+    return _validate(obj, text, schema)
+
+
+def parse_object_stream(chunks: Iterable[str], schema=MacrosEstimate) -> Tuple[BaseModel, str]:
+    """Validate the first JSON object of a streamed reply, without waiting for the rest of the stream.
+
+    Returns the validated object and the text received so far.
+    """
+    scanner = JsonObjectScanner()
+    obj = None
+    for chunk in chunks:
+        obj = scanner.feed(chunk)
+        if obj is not None:
+            break
+    else:
+        obj = scanner.finish()
+    return _validate(obj, scanner.buffer, schema), scanner.buffer
+
+
+def iter_stream_content(response) -> Iterator[str]:
+    """Yield the content deltas of an OpenAI-compatible server-sent events completion."""
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        choices = json.loads(data).get("choices") or []
+        if choices:
+            content = (choices[0].get("delta") or {}).get("content")
+            if content:
+                yield content
+
+
+def reask_prompt(error: ParseError, example: str) -> str:
+    """Follow-up message asking the model to fix exactly what was wrong with its reply."""
+    if error.reason == "no_object":
+        problem = "Your reply did not contain a JSON object."
+    else:
+        problem = f"Your JSON object was not valid: {error.detail}."
+    return f"{problem} Reply again with only this JSON object, whole numbers and no units, nothing else:\n{example}"
@@ -0,0 +1,231 @@
+import os
+import sys
+import json
+import time
+import atexit
+import sqlite3
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+try:
+    import fcntl
+except ImportError:
+    # No file locks (Windows): a single development process is the only maintainer
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Single long-term memory database shared by every crew and user of this host
+LTM_DB_PATH = os.environ.get(
+    "LTM_DB_PATH",
+    os.path.join(os.environ.get("MEMORY_ROOT", "/long_term"), "long_term_memory_storage.db"),
+)
+LTM_BUSY_TIMEOUT_MS = int(os.environ.get("LTM_BUSY_TIMEOUT_MS", 5000))
+LTM_BATCH_SIZE = int(os.environ.get("LTM_BATCH_SIZE", 16))
+LTM_RETENTION_DAYS = int(os.environ.get("LTM_RETENTION_DAYS", 90))
+LTM_MAX_ROWS_PER_USER = int(os.environ.get("LTM_MAX_ROWS_PER_USER", 500))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS long_term_memories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    namespace TEXT NOT NULL,
+    task_description TEXT NOT NULL,
+    metadata TEXT,
+    datetime TEXT,
+    score REAL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ltm_lookup
+    ON long_term_memories (namespace, task_description, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_ltm_created_at
+    ON long_term_memories (created_at);
+"""
+
+
+class _SharedConnection:
+    """One WAL-mode connection per database file and process, with a write batch in front of it."""
+
+    def __init__(self, db_path: str):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.pending: List[tuple] = []
+        self.conn = sqlite3.connect(db_path, timeout=LTM_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA busy_timeout={LTM_BUSY_TIMEOUT_MS}")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def flush_locked(self):
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO long_term_memories (namespace, task_description, metadata, datetime, score, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                self.pending,
+            )
+        self.pending = []
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+
+_connections: Dict[tuple, _SharedConnection] = {}
+_connections_lock = threading.Lock()
+
+
+def get_connection(db_path: str = LTM_DB_PATH) -> _SharedConnection:
+    """Return the shared connection for a database file, reopening it after a fork."""
+    key = (os.getpid(), os.path.abspath(db_path))
+    with _connections_lock:
+        shared = _connections.get(key)
+        if shared is None:
+            shared = _SharedConnection(db_path)
+            _connections[key] = shared
+        return shared
+
+
+def flush_all():
+    """Write out every pending batch of this process."""
+    pid = os.getpid()
+    with _connections_lock:
+        connections = [shared for (owner, _), shared in _connections.items() if owner == pid]
+    for shared in connections:
+        try:
+            shared.flush()
+        except sqlite3.Error as e:
+            logger.error(f"Error flushing long-term memory batch to {shared.db_path}: {str(e)}")
+
+
+atexit.register(flush_all)
+
+
+class ManagedLTMStorage:
+    """Drop-in replacement for crewai's LTMSQLiteStorage, namespaced per user."""
+
+    def __init__(self, namespace: str, db_path: str = LTM_DB_PATH):
+        self.namespace = namespace
+        self.db_path = db_path
+
+    def save(self, task_description: str, metadata: Dict[str, Any], datetime: str, score: Union[int, float]) -> None:
+        shared = get_connection(self.db_path)
+        with shared.lock:
+            shared.pending.append(
+                (self.namespace, task_description, json.dumps(metadata), datetime, score, time.time())
+            )
+            if len(shared.pending) >= LTM_BATCH_SIZE:
+                shared.flush_locked()
+
+    def load(self, task_description: str, latest_n: int) -> Optional[List[Dict[str, Any]]]:
+        shared = get_connection(self.db_path)
+        with shared.lock:
+            # Read-your-writes: anything still batched goes out before the lookup
+            shared.flush_locked()
+            rows = shared.conn.execute(
+                "SELECT metadata, datetime, score FROM long_term_memories "
+                "WHERE namespace = ? AND task_description = ? "
+                "ORDER BY created_at DESC, score ASC LIMIT ?",
+                (self.namespace, task_description, int(latest_n)),
+            ).fetchall()
+        if not rows:
+            return None
+        return [{"metadata": json.loads(row[0]), "datetime": row[1], "score": row[2]} for row in rows]
+
+    def reset(self) -> None:
+        delete_namespace(self.namespace, self.db_path)
+
+
+def delete_namespace(namespace: str, db_path: str = LTM_DB_PATH):
+    """Remove every long-term memory of one user."""
+    shared = get_connection(db_path)
+    with shared.lock:
+        shared.pending = [row for row in shared.pending if row[0] != namespace]
+        with shared.conn:
+            shared.conn.execute("DELETE FROM long_term_memories WHERE namespace = ?", (namespace,))
+
+
+def maintain(db_path: str = LTM_DB_PATH, retention_days: int = LTM_RETENTION_DAYS,
+             max_rows_per_user: int = LTM_MAX_ROWS_PER_USER, vacuum: bool = True) -> Dict[str, int]:
+    """Apply retention, cap rows per user and reclaim space in the long-term memory database."""
+    shared = get_connection(db_path)
+    cutoff = time.time() - retention_days * 86400
+    with shared.lock:
+        shared.flush_locked()
+        with shared.conn:
+            expired = shared.conn.execute(
+                "DELETE FROM long_term_memories WHERE created_at < ?", (cutoff,)
+            ).rowcount
+            trimmed = shared.conn.execute(
+                "DELETE FROM long_term_memories WHERE id IN ("
+                "  SELECT id FROM ("
+                "    SELECT id, ROW_NUMBER() OVER (PARTITION BY namespace ORDER BY created_at DESC) AS rank"
+                "    FROM long_term_memories"
+                "  ) WHERE rank > ?"
+                ")",
+                (max_rows_per_user,),
+            ).rowcount
+        if vacuum:
+            shared.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            shared.conn.execute("VACUUM")
+    stats = {"expired": expired, "trimmed": trimmed}
+    logger.info(f"Long-term memory maintenance finished: {stats}")
+    return stats
+
+
+@contextmanager
+def maintenance_slot(interval: float, db_path: str = LTM_DB_PATH) -> Iterator[bool]:
+    """Yield True in the one worker process that should run the periodic maintenance now, False in the rest.
+
+    Every web worker runs the periodic job; a file lock next to the database lets only one of them work at a
+    time, and the time of the last run, kept in the lock file, stops the others from repeating it right after.
+    """
+    lock_path = db_path + ".maintenance"
+    directory = os.path.dirname(lock_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(lock_path, "a+", encoding="utf-8") as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        f.seek(0)
+        try:
+            last_run = float(f.read().strip() or 0)
+        except ValueError:
+            last_run = 0.0
+        # Half an interval: the workers' timers drift apart, but none of them is a whole interval early
+        if time.time() - last_run < interval / 2:
+            yield False
+            return
+        yield True
+        f.seek(0)
+        f.truncate()
+        f.write(str(time.time()))
+        f.flush()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Maintain the long-term memory SQLite database")
+    parser.add_argument("command", choices=["maintain"])
+    parser.add_argument("--db-path", default=LTM_DB_PATH)
+    parser.add_argument("--retention-days", type=int, default=LTM_RETENTION_DAYS)
+    parser.add_argument("--max-rows-per-user", type=int, default=LTM_MAX_ROWS_PER_USER)
+    parser.add_argument("--no-vacuum", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        maintain(args.db_path, args.retention_days, args.max_rows_per_user, vacuum=not args.no_vacuum)
+    except sqlite3.Error as e:
+        logger.error(f"Error maintaining long-term memory: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Durable write-behind queue for /save-macros: entries are acknowledged once they are in this
+# WAL-mode SQLite file and a background task flushes them to Supabase in batches.
+MACROS_QUEUE_PATH = os.environ.get(
+    "MACROS_QUEUE_PATH", os.path.join(os.environ.get("MEMORY_ROOT", "/long_term"), "macros_queue.db")
+)
+MACROS_FLUSH_BATCH_SIZE = int(os.environ.get("MACROS_FLUSH_BATCH_SIZE", 50))
+# Seconds a flusher owns the rows it claimed; after that another worker may retry them
+MACROS_CLAIM_SECONDS = int(os.environ.get("MACROS_CLAIM_SECONDS", 60))
+# Rejections (4xx) after which a row is moved to failed_macros instead of being retried
+MACROS_MAX_ATTEMPTS = int(os.environ.get("MACROS_MAX_ATTEMPTS", 5))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_macros (
+    idempotency_key TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    date_added TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    claim TEXT,
+    claimed_until REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_pending_macros_user ON pending_macros (username, date_added);
+CREATE INDEX IF NOT EXISTS idx_pending_macros_claim ON pending_macros (claimed_until, created_at);
+CREATE TABLE IF NOT EXISTS failed_macros (
+    idempotency_key TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    date_added TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    failed_at REAL NOT NULL
+);
+"""
+
+_connections: Dict[int, sqlite3.Connection] = {}
+_lock = threading.Lock()
+
+
+def _connection(path: str = MACROS_QUEUE_PATH) -> sqlite3.Connection:
+    # One connection per process (reopened after a fork), serialised by the module lock
+    conn = _connections.get(os.getpid())
+    if conn is None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        # FULL: an acknowledged entry must survive a power loss, not just a crash
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.executescript(SCHEMA)
+        _connections[os.getpid()] = conn
+    return conn
+
+
+def new_idempotency_key() -> str:
+    return str(uuid.uuid4())
+
+
+def enqueue(payload: dict) -> bool:
+    """Durably queue one saved_macros row. Returns False if its idempotency key was already queued."""
+    with _lock:
+        cursor = _connection().execute(
+            "INSERT OR IGNORE INTO pending_macros (idempotency_key, username, date_added, payload, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (payload["idempotency_key"], payload["username"], payload["date_added"], json.dumps(payload), time.time()),
+        )
+    return cursor.rowcount == 1
+
+
+def pending_for(username: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[dict]:
+    """Return the not yet flushed rows of a user, optionally within a date range (inclusive)."""
+    query = "SELECT payload FROM pending_macros WHERE username = ?"
+    params: list = [username]
+    if start_date:
+        query += " AND date_added >= ?"
+        params.append(start_date)
+    if end_date:
+        query += " AND date_added <= ?"
+        params.append(end_date)
+    query += " ORDER BY created_at"
+    with _lock:
+        rows = _connection().execute(query, params).fetchall()
+    return [{**json.loads(row[0]), "id": None, "pending": True} for row in rows]
+
+
+def merge_pending(rows: List[dict], pending: List[dict]) -> List[dict]:
+    """Add pending rows to rows read from Supabase, skipping any that were flushed in the meantime."""
+    flushed = {row.get("idempotency_key") for row in rows if row.get("idempotency_key")}
+    return rows + [row for row in pending if row["idempotency_key"] not in flushed]
+
+
+def _claim(batch_size: int) -> Tuple[str, List[dict]]:
+    claim = str(uuid.uuid4())
+    now = time.time()
+    with _lock:
+        conn = _connection()
+        # IMMEDIATE takes the write lock up front so two workers can't claim the same rows
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE pending_macros SET claim = ?, claimed_until = ? WHERE idempotency_key IN ("
+                "  SELECT idempotency_key FROM pending_macros WHERE claimed_until < ? ORDER BY created_at LIMIT ?"
+                ")",
+                (claim, now + MACROS_CLAIM_SECONDS, now, batch_size),
+            )
+            rows = conn.execute("SELECT payload FROM pending_macros WHERE claim = ?", (claim,)).fetchall()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return claim, [json.loads(row[0]) for row in rows]
+
+
+def _rejected(error: Exception) -> bool:
+    """Whether the database refused the rows themselves (4xx), so that sending them again can't help."""
+    status = getattr(error, "status_code", None)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+def _release(keys: List[str], error: Exception):
+    """Return failed rows to the queue; rejected rows wait a claim period and are set aside after too many attempts."""
+    now = time.time()
+    rejected = _rejected(error)
+    marks = ",".join("?" * len(keys))
+    with _lock:
+        conn = _connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                f"UPDATE pending_macros SET claim = NULL, claimed_until = ?, attempts = attempts + 1, last_error = ? "
+                f"WHERE idempotency_key IN ({marks})",
+                [now + MACROS_CLAIM_SECONDS if rejected else 0, str(error)[:500], *keys],
+            )
+            dead = []
+            if rejected:
+                dead = [row[0] for row in conn.execute(
+                    f"SELECT idempotency_key FROM pending_macros WHERE idempotency_key IN ({marks}) AND attempts >= ?",
+                    [*keys, MACROS_MAX_ATTEMPTS],
+                )]
+            if dead:
+                dead_marks = ",".join("?" * len(dead))
+                conn.execute(
+                    "INSERT OR REPLACE INTO failed_macros "
+                    "SELECT idempotency_key, username, date_added, payload, created_at, attempts, last_error, ? "
+                    f"FROM pending_macros WHERE idempotency_key IN ({dead_marks})",
+                    [now, *dead],
+                )
+                conn.execute(f"DELETE FROM pending_macros WHERE idempotency_key IN ({dead_marks})", dead)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    for key in dead:
+        logger.error(f"Queued macros {key} rejected {MACROS_MAX_ATTEMPTS} times, moved to failed_macros: {str(error)}")
+
+
+def _delete(keys: List[str]):
+    marks = ",".join("?" * len(keys))
+    with _lock:
+        _connection().execute(f"DELETE FROM pending_macros WHERE idempotency_key IN ({marks})", keys)
+
+
+def flush(send_batch: Callable[[List[dict]], None], batch_size: int = MACROS_FLUSH_BATCH_SIZE) -> int:
+    """Send queued rows to the database in batches until the queue is drained. Returns the rows flushed."""
+    flushed = 0
+    while True:
+        _, batch = _claim(batch_size)
+        if not batch:
+            return flushed
+        keys = [row["idempotency_key"] for row in batch]
+        try:
+            send_batch(batch)
+        except Exception as e:
+            logger.error(f"Error flushing {len(batch)} queued macros: {str(e)}")
+            if not _rejected(e) or len(batch) == 1:
+                _release(keys, e)
+                if not _rejected(e):
+                    # The database is unreachable or failing; try again on the next flush
+                    return flushed
+                continue
+            # One bad row fails the whole batch: send the rows one at a time so that the others get through
+            for row in batch:
+                try:
+                    send_batch([row])
+                except Exception as row_error:
+                    _release([row["idempotency_key"]], row_error)
+                    continue
+                _delete([row["idempotency_key"]])
+                flushed += 1
+            continue
+        _delete(keys)
+        flushed += len(batch)
+        logger.info(f"Flushed {len(batch)} queued macros")
+
+
+def queue_depth() -> int:
+    with _lock:
+        return _connection().execute("SELECT COUNT(*) FROM pending_macros").fetchone()[0]
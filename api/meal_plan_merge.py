@@ -0,0 +1,158 @@
+import re
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Meals of a plan in output order, with the share of the daily protein target each one carries
+MEALS = [
+    {"key": "breakfast", "label": "Breakfast", "heading": "### 🥞 **Breakfast Recipe: {title}**", "protein_share": 0.25},
+    {"key": "lunch", "label": "Lunch", "heading": "### 🥗 **Lunch Recipe: {title}**", "protein_share": 0.30},
+    {"key": "dinner", "label": "Dinner", "heading": "### 🍲 **Dinner Recipe: {title}**", "protein_share": 0.30},
+    {"key": "snack", "label": "Mid-day Snack", "heading": "### 🍿 **Mid-Day Protein Snack Idea**\n\n- {title}", "protein_share": 0.15},
+]
+
+MACRO_FIELDS = ("calories", "protein", "carbs", "fats")
+
+# Format every per-meal subtask is asked to answer in, so that the merge step can parse it
+meal_section_format = """Title: [recipe title]
+
+**Ingredients (for 7 servings):**
+
+[list of ingredients along with their quantities]
+
+**Nutritional information (per serving):**
+
+| Calories | Protein | Carbs | Fats |
+|----------|---------|-------|------|
+| [amount of kcal] | [amount of protein] | [amount of carbs] | [amount of fats] |
+
+**Preparation Instructions:**
+
+[list of instructions]
+
+Must be purchased: [comma-separated list of additional ingredients, or None]"""
+
+
+def parse_protein_target(user_input: str) -> Optional[int]:
+    """Find the daily protein target (grams) in the formatted user input."""
+    match = re.search(r"protein target:\s*(\d+)", user_input, re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+def allocate_protein(protein_target: Optional[int]) -> Dict[str, Optional[int]]:
+    """Split the daily protein target across the meals of the plan."""
+    if not protein_target:
+        return {meal["key"]: None for meal in MEALS}
+    budget = {meal["key"]: int(round(protein_target * meal["protein_share"])) for meal in MEALS}
+    # Put the rounding remainder on dinner so the budgets add up to the target exactly
+    budget["dinner"] += protein_target - sum(budget.values())
+    return budget
+
+
+def _number(cell: str) -> Optional[float]:
+    match = re.search(r"-?\d+(?:\.\d+)?", cell.replace(",", ""))
+    return float(match.group(0)) if match else None
+
+
+def parse_nutrition_row(section: str) -> Optional[Dict[str, float]]:
+    """Return the per-serving macros from the first nutrition table row of a section."""
+    for line in section.splitlines():
+        line = line.strip()
+        if not line.startswith("|") or set(line) <= set("|-: "):
+            continue
+        cells = [cell.strip() for cell in line.strip("|").split("|")]
+        if len(cells) != len(MACRO_FIELDS):
+            continue
+        values = [_number(cell) for cell in cells]
+        if all(value is not None for value in values):
+            return dict(zip(MACRO_FIELDS, values))
+    return None
+
+
+def split_section(section: str) -> Dict[str, str]:
+    """Split a per-meal answer into its title, body and additional ingredients."""
+    title = ""
+    purchases = ""
+    body_lines = []
+    for line in section.strip().splitlines():
+        stripped = line.strip()
+        if not title and stripped.lower().startswith("title:"):
+            title = stripped.split(":", 1)[1].strip()
+        elif stripped.lower().startswith("must be purchased:"):
+            purchases = stripped.split(":", 1)[1].strip()
+        else:
+            body_lines.append(line)
+    if purchases.lower().strip(" .") in ("", "none", "n/a"):
+        purchases = ""
+    return {"title": title or "Untitled", "body": "\n".join(body_lines).strip(), "purchases": purchases}
+
+
+def _format_amount(value: float) -> str:
+    return f"{value:.0f}"
+
+
+def summary_table(macros: Dict[str, Optional[Dict[str, float]]]) -> str:
+    """Build the weekly macros summary table; daily and weekly totals are computed, not generated.
+
+    The totals are n/a when any meal's macros are missing.
+    """
+    lines = [
+        "| Meal           |  Calories (kcal) |  Protein (g) |   Carbs (g)  |   Fats (g)   |",
+        "|----------------|------------------|--------------|--------------|--------------|",
+    ]
+    totals = {field: 0.0 for field in MACRO_FIELDS}
+    for meal in MEALS:
+        values = macros.get(meal["key"])
+        if values is None:
+            lines.append(f"| {meal['label']} | n/a | n/a | n/a | n/a |")
+            continue
+        for field in MACRO_FIELDS:
+            totals[field] += values[field]
+        lines.append(
+            f"| {meal['label']} | {_format_amount(values['calories'])} kcal/serving | "
+            f"{_format_amount(values['protein'])} g/serving | {_format_amount(values['carbs'])} g/serving | "
+            f"{_format_amount(values['fats'])} g/serving |"
+        )
+    if any(macros.get(meal["key"]) is None for meal in MEALS):
+        # A total without one of the meals would look right and be wrong
+        lines.append("| Daily Total | n/a | n/a | n/a | n/a |")
+        lines.append("| Weekly Total (7 days) | n/a | n/a | n/a | n/a |")
+        return "\n".join(lines)
+    lines.append(
+        f"| Daily Total | {_format_amount(totals['calories'])} kcal/serving | {_format_amount(totals['protein'])} g/serving | "
+        f"{_format_amount(totals['carbs'])} g/serving | {_format_amount(totals['fats'])} g/serving |"
+    )
+    lines.append(
+        f"| Weekly Total (7 days) | {_format_amount(totals['calories'] * 7)} kcal | {_format_amount(totals['protein'] * 7)} g | "
+        f"{_format_amount(totals['carbs'] * 7)} g | {_format_amount(totals['fats'] * 7)} g |"
+    )
+    return "\n".join(lines)
+
+
+def merge_meal_sections(sections: Dict[str, str]) -> str:
+    """Deterministically assemble per-meal answers into the weekly meal plan output format."""
+    parts = [
+        "### 🍽️ **Weekly Meal Plan**",
+        "Based on your provided ingredients, dietary preferences, restrictions, and daily protein goal, here is your customized meal plan. Each recipe is designed for 7 servings (meal prep for the whole week).",
+    ]
+    macros = {}
+    purchases: List[str] = []
+    for meal in MEALS:
+        section = split_section(sections.get(meal["key"], ""))
+        parts.append(meal["heading"].format(title=section["title"]))
+        parts.append(section["body"])
+        macros[meal["key"]] = parse_nutrition_row(section["body"])
+        if macros[meal["key"]] is None:
+            logger.warning(f"No nutrition table found in the {meal['key']} section")
+        for item in section["purchases"].split(","):
+            item = item.strip()
+            if item:
+                purchases.append(f"- {item} ({meal['label']})")
+
+    parts.append("### 📊 **Weekly Meal Plan Macros Summary**")
+    parts.append(summary_table(macros))
+    if purchases:
+        parts.append("### 🛒 **Additional Ingredients (Must be Purchased):**")
+        parts.append("\n".join(purchases))
+    return "\n\n".join(parts)
@@ -0,0 +1,38 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Tuple
+
+# In-process counters and timings, served as JSON by GET /metrics. Every worker process keeps its
+# own, so with several workers each scrape sees the worker that answered it.
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple], int] = defaultdict(int)
+_timings: Dict[Tuple[str, Tuple], list] = defaultdict(lambda: [0, 0.0, 0.0])
+
+
+def _key(name: str, labels: dict) -> Tuple[str, Tuple]:
+    return name, tuple(sorted(labels.items()))
+
+
+def increment(name: str, amount: int = 1, **labels):
+    with _lock:
+        _counters[_key(name, labels)] += amount
+
+
+def observe(name: str, value: float, **labels):
+    """Record one measurement (e.g. a latency in seconds) as a count, sum and max."""
+    with _lock:
+        timing = _timings[_key(name, labels)]
+        timing[0] += 1
+        timing[1] += value
+        timing[2] = max(timing[2], value)
+
+
+def snapshot() -> dict:
+    with _lock:
+        counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in _counters.items()]
+        timings = [
+            {"name": name, "labels": dict(labels), "count": count, "sum": total, "avg": total / count, "max": peak}
+            for (name, labels), (count, total, peak) in _timings.items()
+        ]
+    return {"counters": counters, "timings": timings}
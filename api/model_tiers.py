@@ -0,0 +1,154 @@
+import os
+import time
+import logging
+from contextvars import ContextVar
+from typing import Any, Callable, List, Optional, Tuple
+
+import metrics
+from meal_plan_merge import MEALS
+
+logger = logging.getLogger(__name__)
+
+# Model tier policy: every crew runs on the tier of its task type, and a small-tier answer that fails
+# validation (or errors) is redone once on the large tier.
+MODEL_TIERS = {
+    "small": os.environ.get("MODEL_SMALL", "sambanova/Meta-Llama-3.1-8B-Instruct"),
+    "large": os.environ.get("MODEL_LARGE", "sambanova/Meta-Llama-3.3-70B-Instruct"),
+}
+ESCALATION_TIER = "large"
+TASK_TIERS = {
+    "routing": os.environ.get("MODEL_TIER_ROUTING", "small"),
+    "followup": os.environ.get("MODEL_TIER_FOLLOWUP", "small"),
+    "create": os.environ.get("MODEL_TIER_CREATE", "large"),
+    "save": os.environ.get("MODEL_TIER_SAVE", "small"),
+    # Folding old turns into the memory summary, which can run on the chat request path
+    "summary": os.environ.get("MODEL_TIER_SUMMARY", "small"),
+}
+for _task, _tier in TASK_TIERS.items():
+    if _tier not in MODEL_TIERS:
+        raise ValueError(f"Unknown model tier {_tier!r} for {_task}, expected one of {', '.join(MODEL_TIERS)}")
+
+# What CrewAI answers with when an agent gives up, and leftovers of a tool call the model didn't finish
+FAILED_ANSWER_MARKERS = ("Agent stopped due to iteration limit or time limit", "Action Input:", "Thought:")
+
+# (tool name, output, seconds) of the tools invoked during the current routing run
+tool_calls: ContextVar[Optional[List[Tuple[str, str, float]]]] = ContextVar("tool_calls", default=None)
+
+
+def start_tool_calls() -> List[Tuple[str, str, float]]:
+    calls: List[Tuple[str, str, float]] = []
+    tool_calls.set(calls)
+    return calls
+
+
+def note_tool_call(name: str, output: str, seconds: float = 0.0) -> str:
+    calls = tool_calls.get()
+    if calls is not None:
+        calls.append((name, output, seconds))
+    return output
+
+
+def _tool_seconds() -> float:
+    return sum(call[2] for call in tool_calls.get() or [])
+
+
+def validate_routing(answer: str) -> Optional[str]:
+    """The router must hand the input to one of its tools rather than answer itself.
+
+    Only a missing tool call escalates: rerunning a router whose tool already ran would redo the tool's
+    work, and the tool's output is the answer anyway (see routed_answer).
+    """
+    return None if tool_calls.get() else "no tool was invoked"
+
+
+def routed_answer(answer: str) -> str:
+    """The router only forwards the output of the tool it picked, so that output is the answer.
+
+    Taking it from the tool call rather than the router's final answer spares the router model from
+    repeating a whole meal plan, and from garbling it on the way.
+    """
+    calls = tool_calls.get()
+    return calls[-1][1] if calls else answer
+
+
+def validate_answer(answer: str) -> Optional[str]:
+    if not answer or not answer.strip():
+        return "empty answer"
+    for marker in FAILED_ANSWER_MARKERS:
+        if marker in answer:
+            return f"answer contains {marker!r}"
+    return None
+
+
+def validate_meal_plan(plan: str) -> Optional[str]:
+    problem = validate_answer(plan)
+    if problem:
+        return problem
+    lowered = plan.lower()
+    missing = [meal["key"] for meal in MEALS if meal["key"] not in lowered]
+    if missing:
+        return f"meal plan is missing {', '.join(missing)}"
+    if lowered.count("ingredients") < len(MEALS) - 1:
+        return "meal plan is missing ingredient lists"
+    return None
+
+
+def validate_meal_section(section: str) -> Optional[str]:
+    problem = validate_answer(section)
+    if problem:
+        return problem
+    return None if "ingredients" in section.lower() else "recipe has no ingredient list"
+
+
+def _record(task: str, tier: str, output: Any, seconds: float, outcome: str):
+    metrics.observe("llm_task_seconds", seconds, task=task, tier=tier, outcome=outcome)
+    usage = getattr(output, "token_usage", None)
+    if usage is not None:
+        for field in ("prompt_tokens", "completion_tokens"):
+            metrics.increment("llm_tokens", int(getattr(usage, field, 0) or 0), task=task, tier=tier, kind=field)
+
+
+def run_tiered(task: str, run: Callable[[str], Any], validate: Callable[[str], Optional[str]] = validate_answer,
+               can_rerun: Callable[[], bool] = lambda: True) -> Any:
+    """Run a crew (run(tier) -> CrewOutput) on the task's tier, escalating to the large tier once if needed.
+
+    A run that fails with an error is only redone if can_rerun() says so. The recorded task time leaves
+    out the tools the crew invoked, which record their own crews' times.
+    """
+    tier = TASK_TIERS[task]
+    while True:
+        started = time.perf_counter()
+        tools_before = _tool_seconds()
+        try:
+            output = run(tier)
+        except Exception as e:
+            _record(task, tier, None, time.perf_counter() - started - (_tool_seconds() - tools_before), "error")
+            if tier == ESCALATION_TIER or not can_rerun():
+                raise
+            problem = f"error: {str(e)}"
+        else:
+            problem = validate(output.raw)
+            seconds = time.perf_counter() - started - (_tool_seconds() - tools_before)
+            _record(task, tier, output, seconds, "invalid" if problem else "ok")
+            if problem is None or tier == ESCALATION_TIER:
+                return output
+        logger.warning(f"Escalating {task} from the {tier} to the {ESCALATION_TIER} model: {problem}")
+        metrics.increment("llm_escalations", task=task, tier=tier)
+        tier = ESCALATION_TIER
+
+
+def run_routing(run: Callable[[str], Any]) -> str:
+    """Run the router crew and return its answer; a router whose tool already ran is never rerun.
+
+    Rerunning it would redo the tool's work (e.g. generate the meal plan again), so a router that fails
+    or answers badly after its tool ran is replaced with the tool's output.
+    """
+    calls = start_tool_calls()
+    try:
+        output = run_tiered("routing", run, validate_routing, can_rerun=lambda: not calls)
+    except Exception as e:
+        if not calls:
+            raise
+        logger.warning(f"Router failed after running {calls[-1][0]}, returning its output: {str(e)}")
+        return calls[-1][1]
+    return routed_answer(output.raw)
@@ -0,0 +1,134 @@
+import os
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Long-range nutrition analytics over a user's saved_macros rows. The rows are converted once into
+# columnar arrays (day, meal, macros) and every rollup is a bincount or cumulative sum over them.
+
+MACRO_COLUMNS = ("calories", "proteins", "carbs", "fats")
+ANALYTICS_MAX_DAYS = int(os.environ.get("ANALYTICS_MAX_DAYS", 366))
+ANALYTICS_WINDOWS = tuple(int(w) for w in os.environ.get("ANALYTICS_WINDOWS", "7,30").split(","))
+# A logged day meets the protein target when it reaches this share of it
+PROTEIN_ADHERENCE_TOLERANCE = float(os.environ.get("PROTEIN_ADHERENCE_TOLERANCE", 0.9))
+
+
+class MacroColumns:
+    """Columnar view of saved_macros rows: day numbers, meal name codes and a (rows x macros) matrix."""
+
+    def __init__(self, rows: List[dict]):
+        count = len(rows)
+        # Days since the epoch, parsed by NumPy in one call
+        self.days = np.array([row["date_added"][:10] for row in rows], dtype="datetime64[D]").astype(np.int64)
+        self.values = np.fromiter(
+            (row.get(column) or 0 for row in rows for column in MACRO_COLUMNS), dtype=np.float64,
+            count=count * len(MACRO_COLUMNS),
+        ).reshape(count, len(MACRO_COLUMNS))
+        names = np.array([(row.get("meal_name") or "Other").strip() for row in rows], dtype=object)
+        if count:
+            self.meal_names, self.meal_codes = np.unique(names, return_inverse=True)
+        else:
+            self.meal_names, self.meal_codes = np.array([], dtype=object), np.array([], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+
+def _series(values: np.ndarray) -> list:
+    # JSON has no NaN: days without data become null
+    series = np.round(values, 1).astype(object)
+    series[np.isnan(values)] = None
+    return series.tolist()
+
+
+def _macros(values: np.ndarray) -> Dict[str, float]:
+    return dict(zip(MACRO_COLUMNS, np.round(values, 1).tolist()))
+
+
+def analyze(
+    columns: MacroColumns,
+    start: date,
+    end: date,
+    windows: Sequence[int] = ANALYTICS_WINDOWS,
+    protein_target: Optional[float] = None,
+) -> dict:
+    """Daily totals, rolling averages, protein adherence and per-meal breakdown for start..end (inclusive).
+
+    Rolling averages are over the days with entries in each window, so a day nobody logged doesn't count
+    as a day of fasting. Rows from up to max(windows) - 1 days before start are used to fill the first windows.
+    """
+    days = (end - start).days + 1
+    lookback = max(windows, default=1) - 1
+    first = int(np.datetime64(start, "D").astype(np.int64)) - lookback
+    span = days + lookback
+
+    offsets = columns.days - first
+    keep = (offsets >= 0) & (offsets < span)
+    offsets, values, codes = offsets[keep], columns.values[keep], columns.meal_codes[keep]
+
+    # (span x macros) daily totals and which days have any entry
+    daily = np.stack(
+        [np.bincount(offsets, weights=values[:, i], minlength=span) for i in range(len(MACRO_COLUMNS))], axis=1
+    )
+    logged = np.bincount(offsets, minlength=span) > 0
+
+    total_sums = np.vstack([np.zeros((1, len(MACRO_COLUMNS))), np.cumsum(daily, axis=0)])
+    logged_counts = np.concatenate([[0], np.cumsum(logged)])
+    rolling = {}
+    for window in windows:
+        sums = (total_sums[window:] - total_sums[:-window])[-days:]
+        counts = (logged_counts[window:] - logged_counts[:-window])[-days:]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averages = sums / counts[:, None]
+        rolling[str(window)] = {column: _series(averages[:, i]) for i, column in enumerate(MACRO_COLUMNS)}
+
+    # Everything below only looks at the requested range
+    daily, logged = daily[lookback:], logged[lookback:]
+    in_range = offsets >= lookback
+    values, codes = values[in_range], codes[in_range]
+    days_logged = int(logged.sum())
+    totals = daily.sum(axis=0)
+
+    adherence = None
+    if protein_target:
+        ratios = daily[logged, MACRO_COLUMNS.index("proteins")] / protein_target
+        met = int((ratios >= PROTEIN_ADHERENCE_TOLERANCE).sum())
+        adherence = {
+            "target": protein_target,
+            "tolerance": PROTEIN_ADHERENCE_TOLERANCE,
+            "days_logged": days_logged,
+            "days_met": met,
+            "rate": round(met / days_logged, 3) if days_logged else None,
+            "average_ratio": round(float(ratios.mean()), 3) if days_logged else None,
+        }
+
+    meal_count = len(columns.meal_names)
+    meal_entries = np.bincount(codes, minlength=meal_count)
+    meal_totals = np.stack(
+        [np.bincount(codes, weights=values[:, i], minlength=meal_count) for i in range(len(MACRO_COLUMNS))], axis=1
+    ).reshape(meal_count, len(MACRO_COLUMNS))
+    calories = max(float(totals[0]), 1.0)
+    meals = {
+        str(name): {
+            "entries": int(meal_entries[index]),
+            "totals": _macros(meal_totals[index]),
+            "daily_averages": _macros(meal_totals[index] / max(days_logged, 1)),
+            "calorie_share": round(float(meal_totals[index, 0]) / calories, 3),
+        }
+        for index, name in enumerate(columns.meal_names)
+        if meal_entries[index]
+    }
+
+    return {
+        "dates": np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1).astype(str).tolist(),
+        "daily_totals": {
+            column: _series(np.where(logged, daily[:, i], np.nan)) for i, column in enumerate(MACRO_COLUMNS)
+        },
+        "rolling_averages": rolling,
+        "totals": _macros(totals),
+        "daily_averages": _macros(totals / max(days_logged, 1)),
+        "days_logged": days_logged,
+        "protein_adherence": adherence,
+        "meals": meals,
+    }
@@ -0,0 +1,275 @@
+import os
+import re
+import csv
+import logging
+from fractions import Fraction
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from meal_plan_merge import MEALS, MACRO_FIELDS, summary_table, parse_nutrition_row
+
+logger = logging.getLogger(__name__)
+
+NUTRIENTS_PATH = os.environ.get(
+    "NUTRIENTS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "nutrients.csv")
+)
+# Share of a recipe's ingredient lines that must be understood before its numbers replace the LLM's
+NUTRITION_MIN_COVERAGE = float(os.environ.get("NUTRITION_MIN_COVERAGE", 0.8))
+SERVINGS = 7
+
+# Placeholder the LLM is asked to leave where the calculator fills in a table
+COMPUTED_TABLE_PLACEHOLDER = "[computed automatically - leave this line unchanged]"
+
+# Grams per unit for mass units, and cups per unit for volume units (converted with each food's grams_per_cup);
+# anything else is a count of items weighed with the food's grams_per_unit
+MASS_UNITS = {
+    "g": 1, "gram": 1, "grams": 1, "kg": 1000, "kgs": 1000, "kilogram": 1000, "kilograms": 1000,
+    "oz": 28.35, "ounce": 28.35, "ounces": 28.35, "lb": 453.6, "lbs": 453.6, "pound": 453.6, "pounds": 453.6,
+}
+VOLUME_UNITS = {
+    "cup": 1, "cups": 1, "c": 1, "tbsp": 1 / 16, "tablespoon": 1 / 16, "tablespoons": 1 / 16,
+    "tsp": 1 / 48, "teaspoon": 1 / 48, "teaspoons": 1 / 48, "ml": 1 / 240, "l": 1000 / 240,
+    "liter": 1000 / 240, "liters": 1000 / 240, "litre": 1000 / 240, "litres": 1000 / 240,
+}
+DEFAULT_GRAMS_PER_CUP = 240
+
+UNICODE_FRACTIONS = {"½": "1/2", "⅓": "1/3", "⅔": "2/3", "¼": "1/4", "¾": "3/4", "⅛": "1/8"}
+QUANTITY_RE = re.compile(r"^(\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?)(?:\s*(?:-|to)\s*\d+(?:\.\d+)?)?\s*")
+
+# Rows are dry grains/legumes or raw meat unless their state says cooked; a cooked line needs a cooked row
+COOKED_RE = re.compile(r"\b(?:cooked|boiled|steamed|roasted|grilled|baked)\b", re.IGNORECASE)
+# Words that turn a matched food into a different one ("chicken stock", "egg noodles"); such lines are
+# left unmatched unless the whole phrase is an alias of its own
+COMPOUND_RE = re.compile(
+    r"^[\s-]*(?:stock|broth|bouillon|noodles?|soup|sauce|powder|paste|sausages?|nuggets|juice|oil|milk|butter|"
+    r"flour|cream|jerky|chips|crackers|bars?)\b",
+    re.IGNORECASE,
+)
+
+
+class NutrientTable:
+    """Local nutrient matrix: one row per food, per-100g kcal/protein/carbs/fats columns."""
+
+    def __init__(self, path: str = NUTRIENTS_PATH):
+        names, aliases, values, per_unit, per_cup, states = [], [], [], [], [], []
+        with open(path, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                index = len(names)
+                names.append(row["name"])
+                for alias in row["aliases"].split("|"):
+                    aliases.append((alias.strip().lower(), index))
+                values.append([float(row["kcal"]), float(row["protein"]), float(row["carbs"]), float(row["fats"])])
+                per_unit.append(float(row["grams_per_unit"]) if row["grams_per_unit"] else np.nan)
+                per_cup.append(float(row["grams_per_cup"]) if row["grams_per_cup"] else DEFAULT_GRAMS_PER_CUP)
+                states.append(row["state"])
+
+        self.names = names
+        self.matrix = np.array(values, dtype=np.float64)
+        self.grams_per_unit = np.array(per_unit, dtype=np.float64)
+        self.grams_per_cup = np.array(per_cup, dtype=np.float64)
+        self.states = states
+        # "quinoa" -> the row of "cooked quinoa", for lines such as "2 cups quinoa, cooked"
+        index_of = {name: index for index, name in enumerate(names)}
+        self.cooked_variant = {
+            index: index_of.get(f"cooked {name}") for index, name in enumerate(names) if states[index] in ("dry", "raw")
+        }
+        # Longest alias first, so "peanut butter" wins over "butter" and "sweet potato" over "potato"
+        self.aliases = sorted(aliases, key=lambda alias: len(alias[0]), reverse=True)
+        self.alias_patterns = [(re.compile(rf"\b{re.escape(alias)}\b"), index) for alias, index in self.aliases]
+
+    def match(self, text: str, cooked: bool = False) -> Optional[int]:
+        text = text.lower()
+        for pattern, index in self.alias_patterns:
+            found = pattern.search(text)
+            if found:
+                if COMPOUND_RE.match(text[found.end():]):
+                    return None
+                if cooked and index in self.cooked_variant:
+                    # None when the table has no cooked values for the food
+                    return self.cooked_variant[index]
+                return index
+        return None
+
+
+_nutrient_table: Optional[NutrientTable] = None
+
+
+def get_nutrient_table() -> NutrientTable:
+    global _nutrient_table
+    if _nutrient_table is None:
+        _nutrient_table = NutrientTable()
+    return _nutrient_table
+
+
+def _parse_quantity(text: str) -> Tuple[Optional[float], str]:
+    for symbol, replacement in UNICODE_FRACTIONS.items():
+        text = text.replace(symbol, f" {replacement}")
+    text = text.strip()
+    match = QUANTITY_RE.match(text)
+    if not match:
+        return None, text
+    amount = float(sum(Fraction(part) for part in match.group(1).split()))
+    return amount, text[match.end():]
+
+
+def parse_ingredient(line: str, table: NutrientTable) -> Tuple[Optional[int], Optional[float], bool]:
+    """Parse one ingredient line into (food index, grams, understood)."""
+    text = re.sub(r"^\s*(?:[-*•]|\d+[.)])\s+", "", line)
+    # Checked before the notes are dropped, for lines such as "1 cup quinoa (cooked)"
+    cooked = bool(COOKED_RE.search(text))
+    # Drop notes such as "(Must be purchased)" or "(about 2 cups)"
+    text = re.sub(r"\([^)]*\)", "", text).strip()
+    amount, rest = _parse_quantity(text)
+    if amount is None and ":" in text:
+        # "Chicken breast: 1.5 kg" style lines
+        name, quantity = text.split(":", 1)
+        amount, unit_rest = _parse_quantity(quantity)
+        rest = f"{unit_rest} {name}"
+
+    food = table.match(rest or text, cooked)
+    if food is None:
+        return None, None, False
+    if amount is None:
+        # "Salt and pepper to taste" and similar negligible lines still count as understood
+        understood = table.matrix[food].sum() == 0 or "to taste" in text.lower()
+        return food, 0.0, understood
+
+    unit_match = re.match(r"([a-zA-Z]+)\.?\s*", rest)
+    unit = unit_match.group(1).lower() if unit_match else ""
+    if unit in MASS_UNITS:
+        return food, amount * MASS_UNITS[unit], True
+    if unit in VOLUME_UNITS:
+        return food, amount * VOLUME_UNITS[unit] * table.grams_per_cup[food], True
+    # Anything else ("14 large eggs", "2 red bell peppers", "1 can chickpeas") is a count of items
+    if not np.isnan(table.grams_per_unit[food]):
+        return food, amount * table.grams_per_unit[food], True
+    return food, None, False
+
+
+def ingredient_lines(section: str) -> List[str]:
+    """Return the ingredient lines between the Ingredients header and the next bold header."""
+    lines = []
+    inside = False
+    for line in section.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("**Ingredients"):
+            inside = True
+            continue
+        if inside and stripped.startswith("**"):
+            break
+        if inside and stripped:
+            lines.append(stripped)
+    return lines
+
+
+def compute_macros(recipes: Dict[str, List[str]], servings: int = SERVINGS) -> Dict[str, Dict]:
+    """Compute per-serving macros of several recipes in one vectorised pass over the nutrient matrix."""
+    table = get_nutrient_table()
+    keys = list(recipes)
+    grams = np.zeros((len(keys), len(table.names)), dtype=np.float64)
+    coverage = np.zeros(len(keys), dtype=np.float64)
+    for row, key in enumerate(keys):
+        lines = recipes[key]
+        understood = 0
+        for line in lines:
+            food, amount, ok = parse_ingredient(line, table)
+            if ok:
+                understood += 1
+                grams[row, food] += amount
+        coverage[row] = understood / len(lines) if lines else 0.0
+
+    # (recipes x foods) grams @ (foods x macros) per 100g -> (recipes x macros) per batch
+    per_serving = grams @ table.matrix / 100.0 / servings
+    return {
+        key: {
+            "macros": dict(zip(MACRO_FIELDS, np.round(per_serving[row]).tolist())),
+            "coverage": float(coverage[row]),
+        }
+        for row, key in enumerate(keys)
+    }
+
+
+def nutrition_table(macros: Dict[str, float]) -> str:
+    return "\n".join([
+        "| Calories | Protein | Carbs | Fats |",
+        "|----------|---------|-------|------|",
+        f"| {macros['calories']:.0f} kcal | {macros['protein']:.0f} g | {macros['carbs']:.0f} g | {macros['fats']:.0f} g |",
+    ])
+
+
+def _split_sections(plan: str) -> List[str]:
+    return re.split(r"(?m)^(?=\s*### )", plan)
+
+
+def _meal_key(heading: str) -> Optional[str]:
+    heading = heading.lower()
+    for meal in MEALS:
+        if meal["key"] in heading:
+            return meal["key"]
+    return None
+
+
+def _replace_block(section: str, header_prefix: str, replacement: str) -> str:
+    """Replace everything between a header line and the next header with the given text."""
+    trailing = section[len(section.rstrip("\n")):]
+    lines = section.rstrip("\n").splitlines()
+    for start, line in enumerate(lines):
+        if line.strip().startswith(header_prefix):
+            end = start + 1
+            while end < len(lines) and not lines[end].strip().startswith(("**", "###")):
+                end += 1
+            return "\n".join(lines[:start + 1] + ["", replacement, ""] + lines[end:]).rstrip("\n") + trailing
+    return section
+
+
+def with_table_placeholders(template: str) -> str:
+    """Replace every markdown table of an output template with the computed-table placeholder."""
+    lines = []
+    for line in template.splitlines():
+        if line.strip().startswith("|"):
+            if not lines or lines[-1] != COMPUTED_TABLE_PLACEHOLDER:
+                lines.append(COMPUTED_TABLE_PLACEHOLDER)
+        else:
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def apply_nutrition(plan: str, fill: bool = False) -> str:
+    """Fill or verify the per-serving and weekly summary tables of a generated meal plan.
+
+    In verify mode a recipe's table is only replaced when enough of its ingredients were understood;
+    in fill mode (the LLM left placeholders) the computed estimate is always written.
+    """
+    sections = _split_sections(plan)
+    recipes = {}
+    for section in sections:
+        key = _meal_key(section.strip().splitlines()[0]) if section.strip() else None
+        if key and key not in recipes:
+            recipes[key] = ingredient_lines(section)
+    if not recipes:
+        return plan
+
+    computed = compute_macros(recipes)
+    summary_macros = {}
+    summary_index = None
+    for index, section in enumerate(sections):
+        key = _meal_key(section.strip().splitlines()[0]) if section.strip() else None
+        if key and key in computed:
+            result = computed[key]
+            if fill or result["coverage"] >= NUTRITION_MIN_COVERAGE:
+                sections[index] = _replace_block(section, "**Nutritional information", nutrition_table(result["macros"]))
+                summary_macros[key] = result["macros"]
+            else:
+                logger.info(f"Keeping generated nutrition for {key}, only {result['coverage']:.0%} of ingredients understood")
+                # The generated numbers are still used for the summary so that its totals stay consistent
+                summary_macros[key] = parse_nutrition_row(section)
+        elif "macros summary" in section.lower():
+            summary_index = index
+
+    if summary_index is not None:
+        sections[summary_index] = _replace_block(
+            sections[summary_index], "### 📊", summary_table(summary_macros)
+        )
+    return "".join(sections)
+
@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+import logging
+import argparse
+from typing import List, Union
+
+import numpy as np
+
+# Quantized ONNX Runtime path for the all-MiniLM-L6-v2 query encoder. Export once (needs torch and
+# transformers), then serve with only onnxruntime and tokenizers installed:
+#   python onnx_encoder.py export
+#   python onnx_encoder.py parity
+# and set EMBEDDING_BACKEND=onnx for the API (or EMBEDDING_RUNTIME=onnx for the embedding sidecar).
+
+logger = logging.getLogger(__name__)
+
+ONNX_MODEL_DIR = os.environ.get(
+    "ONNX_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "all-MiniLM-L6-v2-int8")
+)
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", 1))
+SOURCE_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# all-MiniLM-L6-v2 truncates inputs at 256 word pieces
+MAX_SEQ_LENGTH = 256
+# Parity threshold against the torch embeddings
+MIN_COSINE_SIMILARITY = 0.99
+
+
+class OnnxEncoder:
+    """Drop-in replacement for SentenceTransformer.encode() backed by the int8 ONNX export."""
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, threads: int = ONNX_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, "model_int8.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+    def encode(self, sentences: Union[str, List[str]]) -> np.ndarray:
+        single = isinstance(sentences, str)
+        encodings = self.tokenizer.encode_batch([sentences] if single else list(sentences))
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+        # Mean pooling over the real tokens, then L2 normalisation, as in the sentence-transformers pipeline
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        vectors = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        vectors = vectors.astype(np.float32)
+        return vectors[0] if single else vectors
+
+
+def export(model_dir: str = ONNX_MODEL_DIR):
+    """Export all-MiniLM-L6-v2 to ONNX and quantize its weights to int8."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(SOURCE_MODEL)
+    model = AutoModel.from_pretrained(SOURCE_MODEL).eval()
+    tokenizer.backend_tokenizer.save(os.path.join(model_dir, "tokenizer.json"))
+
+    sample = tokenizer(["chicken breast, quinoa, spinach"], return_tensors="pt")
+    float_path = os.path.join(model_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            float_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "token_type_ids": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=14,
+        )
+    quantize_dynamic(float_path, os.path.join(model_dir, "model_int8.onnx"), weight_type=QuantType.QInt8)
+    os.unlink(float_path)
+    logger.info(f"Exported int8 ONNX model to {model_dir}")
+
+
+def parity(queries: List[str], model_dir: str = ONNX_MODEL_DIR) -> float:
+    """Return the lowest cosine similarity between the torch and ONNX embeddings of the queries."""
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer("all-MiniLM-L6-v2", device="cpu").encode(queries, normalize_embeddings=True)
+    candidate = OnnxEncoder(model_dir).encode(queries)
+    similarities = (reference * candidate).sum(axis=1)
+    for query, similarity in zip(queries, similarities):
+        logger.info(f"cosine {similarity:.4f}  {query[:60]!r}")
+    return float(similarities.min())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Quantized ONNX encoder for all-MiniLM-L6-v2")
+    parser.add_argument("command", choices=["export", "parity"])
+    parser.add_argument("--model-dir", default=ONNX_MODEL_DIR)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        start = time.perf_counter()
+        export(args.model_dir)
+        logger.info(f"Export finished in {time.perf_counter() - start:.1f}s")
+    else:
+        from benchmarks import load_sample_inputs
+        queries = list(load_sample_inputs().values()) + [
+            "high protein breakfast with eggs and spinach",
+            "vegan lunch with lentils and quinoa",
+            "dairy-free salmon dinner",
+            "peanut-free protein snack",
+        ]
+        lowest = parity(queries, args.model_dir)
+        logger.info(f"Lowest cosine similarity: {lowest:.4f} (threshold {MIN_COSINE_SIMILARITY})")
+        sys.exit(0 if lowest >= MIN_COSINE_SIMILARITY else 1)
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import metrics
+from meal_plan_merge import MEALS
+
+logger = logging.getLogger(__name__)
+
+# Speculative recipe retrieval: as soon as a user's ingredients are known (after /identify-ingredients
+# or when the create page is submitted), their candidate recipes are embedded and fetched from Qdrant in
+# the background, so the vector search of the meal plan crew that follows finds them ready. Results are
+# kept in a SQLite file shared by the worker processes, because the /chat request that uses them is
+# usually served by a different worker than the one that started the prefetch.
+RECIPE_PREFETCH = os.environ.get("RECIPE_PREFETCH", "on") == "on"
+RECIPE_PREFETCH_PATH = os.environ.get(
+    "RECIPE_PREFETCH_PATH", os.path.join(os.environ.get("MEMORY_ROOT", "/long_term"), "recipe_prefetch.db")
+)
+RECIPE_PREFETCH_TTL = int(os.environ.get("RECIPE_PREFETCH_TTL", 600))
+RECIPE_PREFETCH_MAX_USERS = int(os.environ.get("RECIPE_PREFETCH_MAX_USERS", 1000))
+RECIPE_PREFETCH_THREADS = int(os.environ.get("RECIPE_PREFETCH_THREADS", 2))
+# Cosine similarity a search query needs with a prefetched query to reuse its recipes
+RECIPE_PREFETCH_MIN_SIMILARITY = float(os.environ.get("RECIPE_PREFETCH_MIN_SIMILARITY", 0.8))
+# Seconds a search of one of the prefetched queries waits for a prefetch that is still running
+RECIPE_PREFETCH_WAIT = float(os.environ.get("RECIPE_PREFETCH_WAIT", 10))
+RECIPE_PREFETCH_POLL = 0.05
+
+# fetch(queries) -> (query vectors, one list of recipe payloads per query)
+Fetch = Callable[[List[str]], Tuple[np.ndarray, List[list]]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipe_prefetches (
+    user_id TEXT PRIMARY KEY,
+    token TEXT NOT NULL,
+    queries TEXT NOT NULL,
+    vectors BLOB,
+    dim INTEGER,
+    results TEXT,
+    started REAL NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+_connections: Dict[int, sqlite3.Connection] = {}
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _connection(path: str = RECIPE_PREFETCH_PATH) -> sqlite3.Connection:
+    # One connection per process (reopened after a fork), serialised by the module lock
+    conn = _connections.get(os.getpid())
+    if conn is None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        # A lost prefetch only costs a Qdrant search
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _connections[os.getpid()] = conn
+    return conn
+
+
+def _normalize(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def prefetch_queries(ingredients: Sequence[str], user_input: Optional[str] = None) -> List[str]:
+    """Searches the meal plan crew is likely to run for this ingredient set."""
+    listed = ", ".join(ingredient.strip() for ingredient in ingredients if ingredient.strip())
+    queries = [f"{meal['label']} recipe with {listed}" for meal in MEALS]
+    if user_input:
+        # The exact searches of the parallel meal plan mode
+        queries += [f"{meal['label']} recipe. {user_input}" for meal in MEALS]
+    return queries
+
+
+def _store(user_id: str, token: str, queries: List[str], fetch: Fetch):
+    vectors, results = fetch(queries)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    with _lock:
+        # A newer prefetch of the same user has replaced this one if the token changed
+        _connection().execute(
+            "UPDATE recipe_prefetches SET vectors = ?, dim = ?, results = ? WHERE user_id = ? AND token = ?",
+            (vectors.tobytes(), vectors.shape[1], json.dumps(results), user_id, token),
+        )
+
+
+def start(user_id: str, queries: List[str], fetch: Fetch) -> Future:
+    """Start fetching the recipes of the queries for a user in the background, replacing any earlier prefetch."""
+    global _executor
+    token = str(uuid.uuid4())
+    now = time.time()
+    with _lock:
+        conn = _connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO recipe_prefetches (user_id, token, queries, started, expires) VALUES (?, ?, ?, ?, ?)",
+            (user_id, token, json.dumps([_normalize(query) for query in queries]), now, now + RECIPE_PREFETCH_TTL),
+        )
+        conn.execute("DELETE FROM recipe_prefetches WHERE expires < ?", (now,))
+        conn.execute(
+            "DELETE FROM recipe_prefetches WHERE user_id NOT IN ("
+            "  SELECT user_id FROM recipe_prefetches ORDER BY started DESC LIMIT ?"
+            ")",
+            (RECIPE_PREFETCH_MAX_USERS,),
+        )
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=RECIPE_PREFETCH_THREADS, thread_name_prefix="recipe-prefetch")
+        future = _executor.submit(_store, user_id, token, queries, fetch)
+
+    def log_failure(done: Future):
+        if done.exception() is not None:
+            logger.error(f"Error prefetching recipes for user {user_id}: {str(done.exception())}")
+            # Searches must not wait for a prefetch that will never finish
+            with _lock:
+                _connection().execute(
+                    "DELETE FROM recipe_prefetches WHERE user_id = ? AND token = ?", (user_id, token)
+                )
+
+    future.add_done_callback(log_failure)
+    logger.info(f"Prefetching recipes for user {user_id} ({len(queries)} queries)")
+    return future
+
+
+def _read(user_id: str) -> Optional[tuple]:
+    with _lock:
+        return _connection().execute(
+            "SELECT queries, vectors, dim, results FROM recipe_prefetches WHERE user_id = ? AND expires >= ?",
+            (user_id, time.time()),
+        ).fetchone()
+
+
+def _outcome(outcome: str):
+    metrics.increment("recipe_prefetch_lookups", outcome=outcome)
+
+
+def lookup(user_id: Optional[str], query: str, encode: Callable[[str], np.ndarray]) -> Tuple[Optional[list], Optional[np.ndarray]]:
+    """Return (recipe payloads, None) when a prefetch covers the query, else (None, query vector or None).
+
+    The query vector is handed back on a miss so that the caller doesn't encode the query twice. Only a
+    search for one of the prefetched queries waits for a prefetch that is still running.
+    """
+    if not user_id:
+        return None, None
+    row = _read(user_id)
+    if row is None:
+        _outcome("none")
+        return None, None
+
+    queries = json.loads(row[0])
+    normalized = _normalize(query)
+    exact = normalized in queries
+    if row[3] is None:
+        if not exact:
+            _outcome("not_ready")
+            return None, None
+        deadline = time.monotonic() + RECIPE_PREFETCH_WAIT
+        while row is not None and row[3] is None and time.monotonic() < deadline:
+            time.sleep(RECIPE_PREFETCH_POLL)
+            row = _read(user_id)
+        if row is None or row[3] is None:
+            logger.info(f"Recipe prefetch for user {user_id} still running, searching directly")
+            _outcome("not_ready")
+            return None, None
+        queries = json.loads(row[0])
+
+    results = json.loads(row[3])
+    if normalized in queries:
+        logger.info(f"Recipe prefetch hit for user {user_id} (same query)")
+        _outcome("hit")
+        return results[queries.index(normalized)], None
+
+    vectors = np.frombuffer(row[1], dtype=np.float32).reshape(-1, row[2])
+    query_vector = np.asarray(encode(query), dtype=np.float32)
+    # Vectors from the torch encoder aren't normalised
+    unit = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+    prefetched = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    similarities = prefetched @ unit
+    best = int(np.argmax(similarities))
+    if similarities[best] >= RECIPE_PREFETCH_MIN_SIMILARITY:
+        logger.info(f"Recipe prefetch hit for user {user_id} (similarity {similarities[best]:.2f})")
+        _outcome("similar_hit")
+        return results[best], None
+    logger.info(f"Recipe prefetch miss for user {user_id} (best similarity {similarities[best]:.2f})")
+    _outcome("miss")
+    return None, query_vector
@@ -0,0 +1,442 @@
+import os
+import sys
+import json
+import time
+import base64
+import hashlib
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+# Record/replay harness for end-to-end chat runs. Recording captures every upstream HTTP interaction of a
+# run (SambaNova completions, Qdrant searches, Supabase and Cohere calls) with its timing, plus the query
+# embeddings, into one cassette per input. Replaying re-runs the same chat turn offline against the cassette,
+# optionally with the recorded latencies. Run from the api folder:
+#   python replay.py record                      # live, needs the API keys
+#   python replay.py replay --latency recorded   # offline, as slow as the recording
+#   python replay.py replay --save-baseline      # offline, store the metrics to compare against
+#   python replay.py check                       # offline, exits 1 on a regression (for CI)
+# The inputs are the sample inputs of misc/rag_test.ipynb.
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+CASSETTE_DIR = os.environ.get("CASSETTE_DIR", os.path.join(API_DIR, "cassettes"))
+BASELINE_FILE = "baseline.json"
+CASSETTE_VERSION = 1
+
+# Hop-by-hop and encoding headers don't apply to the stored (decoded) bodies; cookies are never stored
+DROPPED_HEADERS = {"content-encoding", "transfer-encoding", "content-length", "connection", "set-cookie"}
+
+
+class UnrecordedRequest(ConnectionError):
+    """A replayed run made a request the cassette has no response for."""
+
+
+def _service(url: str) -> str:
+    host = urlsplit(url).hostname or ""
+    qdrant_host = urlsplit(os.environ.get("QDRANT_URL") or "").hostname
+    for name in ("sambanova", "supabase", "cohere"):
+        if name in host:
+            return name
+    if "qdrant" in host or (qdrant_host and host == qdrant_host):
+        return "qdrant"
+    return host
+
+
+def _route(method: str, url: str) -> str:
+    # The host is left out so that a cassette replays with any QDRANT_URL/SUPABASE_URL
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{method.upper()} {parts.path}?{query}"
+
+
+def _body_bytes(body) -> bytes:
+    if body is None:
+        return b""
+    return body.encode("utf-8") if isinstance(body, str) else bytes(body)
+
+
+def _encode_body(data: bytes) -> dict:
+    try:
+        return {"text": data.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(data).decode("ascii")}
+
+
+def _decode_body(stored: dict) -> bytes:
+    if "base64" in stored:
+        return base64.b64decode(stored["base64"])
+    return stored.get("text", "").encode("utf-8")
+
+
+def _prompt_tokens(body: bytes) -> int:
+    """Tokens of the messages of a chat completion request, to catch prompts growing between versions."""
+    from context_assembly import count_tokens
+    try:
+        messages = json.loads(body).get("messages") or []
+    except (ValueError, AttributeError):
+        return 0
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        total += count_tokens(content or "")
+    return total
+
+
+class Cassette:
+    """Recorded upstream interactions and query embeddings of one chat run."""
+
+    def __init__(self, path: str, mode: str, latency: bool = False):
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.interactions: List[dict] = []
+        self.embeddings: Dict[str, list] = {}
+        self.input = None
+        self._lock = threading.Lock()
+        self.reset_stats()
+        if mode == "replay":
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != CASSETTE_VERSION:
+                raise ValueError(f"{path}: unsupported cassette version {data.get('version')}")
+            self.input = data["input"]
+            self.interactions = data["interactions"]
+            self.embeddings = data["embeddings"]
+            # Unconsumed interactions by exact request, and by route for requests whose body changed
+            self._by_key = defaultdict(list)
+            self._by_route = defaultdict(list)
+            for interaction in self.interactions:
+                self._by_key[interaction["key"]].append(interaction)
+                self._by_route[interaction["route"]].append(interaction)
+
+    def reset_stats(self):
+        self.stats = {
+            "calls": defaultdict(int),
+            "upstream_seconds": 0.0,
+            "inside_seconds": 0.0,
+            "prompt_tokens_sent": 0,
+            "drift": 0,
+            "unmatched": 0,
+        }
+
+    def _count(self, service: str, body: bytes, elapsed: float, inside: float):
+        with self._lock:
+            self.stats["calls"][service] += 1
+            self.stats["upstream_seconds"] += elapsed
+            self.stats["inside_seconds"] += inside
+            if service == "sambanova":
+                self.stats["prompt_tokens_sent"] += _prompt_tokens(body)
+
+    def record(self, method: str, url: str, body: bytes, status: int, headers: dict, content: bytes, elapsed: float):
+        route = _route(method, url)
+        interaction = {
+            "service": _service(url),
+            "route": route,
+            "key": route + " " + hashlib.sha256(body).hexdigest(),
+            "request": _encode_body(body),
+            "status": status,
+            "headers": {k: v for k, v in headers.items() if k.lower() not in DROPPED_HEADERS},
+            "body": _encode_body(content),
+            "elapsed": elapsed,
+        }
+        with self._lock:
+            self.interactions.append(interaction)
+        self._count(interaction["service"], body, elapsed, elapsed)
+
+    def match(self, method: str, url: str, body: bytes) -> dict:
+        route = _route(method, url)
+        key = route + " " + hashlib.sha256(body).hexdigest()
+        with self._lock:
+            if self._by_key[key]:
+                interaction = self._by_key[key].pop(0)
+                self._by_route[route].remove(interaction)
+            elif self._by_route[route]:
+                # Same endpoint, different request (e.g. a changed prompt): serve the next recording in order
+                interaction = self._by_route[route].pop(0)
+                self._by_key[interaction["key"]].remove(interaction)
+                self.stats["drift"] += 1
+            else:
+                self.stats["unmatched"] += 1
+                raise UnrecordedRequest(f"No recorded response for {route}")
+        return interaction
+
+    def replay(self, method: str, url: str, body: bytes) -> dict:
+        started = time.perf_counter()
+        interaction = self.match(method, url, body)
+        if self.latency:
+            time.sleep(interaction["elapsed"])
+        self._count(interaction["service"], body, interaction["elapsed"], time.perf_counter() - started)
+        return interaction
+
+    def save(self, summary: dict):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": CASSETTE_VERSION,
+                "input": self.input,
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "summary": summary,
+                "interactions": self.interactions,
+                "embeddings": self.embeddings,
+            }, f, indent=1)
+
+
+_active: Optional[Cassette] = None
+# Set while replaying: traffic outside of a cassette (e.g. a background flush) must not go out either
+_offline = False
+
+
+def _passthrough(cassette: Optional[Cassette], method: str, url: str) -> bool:
+    if cassette is not None:
+        return cassette.mode == "record"
+    if _offline:
+        raise UnrecordedRequest(f"Offline replay, no cassette for {method} {url}")
+    return True
+
+
+def install(mode: str):
+    """Route requests and httpx traffic through the active cassette."""
+    global _offline
+    _offline = mode == "replay"
+    import requests
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers
+
+    original_send = requests.Session.send
+
+    def requests_send(self, request, **kwargs):
+        cassette = _active
+        body = _body_bytes(request.body)
+        if _passthrough(cassette, request.method, request.url):
+            started = time.perf_counter()
+            response = original_send(self, request, **kwargs)
+            content = response.content
+            if cassette is not None:
+                cassette.record(request.method, request.url, body, response.status_code, dict(response.headers),
+                                content, time.perf_counter() - started)
+            return response
+        interaction = cassette.replay(request.method, request.url, body)
+        response = requests.Response()
+        response.status_code = interaction["status"]
+        response.headers = CaseInsensitiveDict(interaction["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = _decode_body(interaction["body"])
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.reason = ""
+        return response
+
+    requests.Session.send = requests_send
+
+    try:
+        import httpx
+    except ImportError:
+        return
+
+    original_client_send = httpx.Client.send
+    original_async_send = httpx.AsyncClient.send
+
+    def _replayed(cassette: Cassette, request) -> "httpx.Response":
+        interaction = cassette.replay(request.method, str(request.url), request.read())
+        return httpx.Response(
+            interaction["status"], headers=interaction["headers"], content=_decode_body(interaction["body"]),
+            request=request,
+        )
+
+    def client_send(self, request, **kwargs):
+        cassette = _active
+        if _passthrough(cassette, request.method, str(request.url)):
+            started = time.perf_counter()
+            response = original_client_send(self, request, **kwargs)
+            if cassette is not None:
+                # Streams are read to the end while recording
+                content = response.read()
+                cassette.record(request.method, str(request.url), request.read(), response.status_code,
+                                dict(response.headers), content, time.perf_counter() - started)
+            return response
+        return _replayed(cassette, request)
+
+    async def async_send(self, request, **kwargs):
+        cassette = _active
+        if _passthrough(cassette, request.method, str(request.url)):
+            started = time.perf_counter()
+            response = await original_async_send(self, request, **kwargs)
+            if cassette is not None:
+                content = await response.aread()
+                cassette.record(request.method, str(request.url), request.read(), response.status_code,
+                                dict(response.headers), content, time.perf_counter() - started)
+            return response
+        return _replayed(cassette, request)
+
+    httpx.Client.send = client_send
+    httpx.AsyncClient.send = async_send
+
+
+class CassetteEncoder:
+    """Wraps the query encoder: stores its vectors while recording, serves them while replaying."""
+
+    def __init__(self, inner=None):
+        self.inner = inner
+
+    def encode(self, sentences, **kwargs):
+        import numpy as np
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        cassette = _active
+        if cassette is not None and cassette.mode == "replay":
+            missing = [text for text in texts if text not in cassette.embeddings]
+            if missing:
+                cassette.stats["unmatched"] += 1
+                raise UnrecordedRequest(f"No recorded embedding for {missing[0][:60]!r}")
+            vectors = np.array([cassette.embeddings[text] for text in texts], dtype=np.float32)
+        else:
+            if self.inner is None:
+                raise UnrecordedRequest("No encoder outside of a replay")
+            vectors = np.asarray(self.inner.encode(texts, **kwargs), dtype=np.float32).reshape(len(texts), -1)
+            if cassette is not None:
+                for text, vector in zip(texts, vectors):
+                    cassette.embeddings[text] = vector.tolist()
+        return vectors[0] if single else vectors
+
+
+def prepare_environment(mode: str):
+    """Isolate the run's memory and switch off telemetry; must run before main is imported."""
+    os.environ["MEMORY_ROOT"] = tempfile.mkdtemp(prefix="replay-memory-")
+    os.environ.pop("LTM_DB_PATH", None)
+    os.environ["CREWAI_DISABLE_TELEMETRY"] = "true"
+    os.environ["OTEL_SDK_DISABLED"] = "true"
+    os.environ["ANONYMIZED_TELEMETRY"] = "False"
+    os.environ["LITELLM_LOCAL_MODEL_COST_MAP"] = "True"
+    if mode == "replay":
+        # Recorded vectors replace the model, so don't load it; credentials only need to exist
+        os.environ["EMBEDDING_BACKEND"] = "service"
+        for name in ("SAMBANOVA_API_KEY", "COHERE_API_KEY", "QDRANT_API_KEY"):
+            os.environ.setdefault(name, "replay")
+        os.environ.setdefault("QDRANT_URL", "http://qdrant.replay:6333")
+
+
+def run_input(app, name: str, text: str, cassette: Cassette) -> dict:
+    """Run one chat turn against the cassette and summarise its upstream calls and timings."""
+    global _active
+    _active = cassette
+    cassette.input = text
+    cassette.reset_stats()
+    started = time.perf_counter()
+    try:
+        _, usage = app.run_chat_turn(text, f"replay-{name}")
+        error = None
+    except Exception as e:
+        usage, error = {}, f"{type(e).__name__}: {str(e)}"
+    finally:
+        _active = None
+    wall = time.perf_counter() - started
+    stats = cassette.stats
+    return {
+        "calls": dict(stats["calls"]),
+        "prompt_tokens_sent": stats["prompt_tokens_sent"],
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "upstream_seconds": round(stats["upstream_seconds"], 3),
+        "wall_seconds": round(wall, 3),
+        # Time spent in our own code: everything but waiting on (or replaying) upstream calls
+        "overhead_seconds": round(max(wall - stats["inside_seconds"], 0.0), 3),
+        "drift": stats["drift"],
+        "unmatched": stats["unmatched"],
+        "error": error,
+    }
+
+
+def compare(name: str, baseline: dict, current: dict, token_tolerance: float, overhead_tolerance: float,
+            overhead_floor: float) -> List[str]:
+    """Return the regressions of a run against its baseline."""
+    problems = []
+    if current["error"]:
+        problems.append(f"{name}: run failed: {current['error']}")
+    if current["unmatched"]:
+        problems.append(f"{name}: {current['unmatched']} upstream calls not in the cassette")
+    for service, count in current["calls"].items():
+        if count > baseline["calls"].get(service, 0):
+            problems.append(f"{name}: {service} calls {baseline['calls'].get(service, 0)} -> {count}")
+    for field in ("prompt_tokens_sent", "completion_tokens"):
+        if current[field] > baseline[field] * (1 + token_tolerance):
+            problems.append(f"{name}: {field} {baseline[field]} -> {current[field]}")
+    allowed = max(baseline["overhead_seconds"] * (1 + overhead_tolerance), baseline["overhead_seconds"] + overhead_floor)
+    if current["overhead_seconds"] > allowed:
+        problems.append(f"{name}: orchestration overhead {baseline['overhead_seconds']:.3f}s -> {current['overhead_seconds']:.3f}s")
+    return problems
+
+
+def print_table(results: Dict[str, dict]):
+    print(f"{'input':<10} {'llm':>4} {'qdrant':>6} {'supabase':>8} {'other':>5} {'prompt tok':>10} {'compl tok':>9} "
+          f"{'upstream s':>10} {'wall s':>8} {'overhead s':>10} {'drift':>5}")
+    for name, result in results.items():
+        calls = dict(result["calls"])
+        llm, qdrant, supabase = calls.pop("sambanova", 0), calls.pop("qdrant", 0), calls.pop("supabase", 0)
+        print(f"{name:<10} {llm:>4} {qdrant:>6} {supabase:>8} {sum(calls.values()):>5} {result['prompt_tokens_sent']:>10} "
+              f"{result['completion_tokens']:>9} {result['upstream_seconds']:>10.2f} {result['wall_seconds']:>8.2f} "
+              f"{result['overhead_seconds']:>10.3f} {result['drift']:>5}" + (f"  {result['error']}" if result["error"] else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and replay end-to-end chat runs")
+    parser.add_argument("command", choices=["record", "replay", "check"])
+    parser.add_argument("--inputs", help="Comma-separated input names (default: all of misc/rag_test.ipynb)")
+    parser.add_argument("--dir", default=CASSETTE_DIR)
+    parser.add_argument("--latency", choices=["none", "recorded"], default="none",
+                        help="Replay instantly or with the recorded upstream latencies")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the replayed metrics for `check`")
+    parser.add_argument("--token-tolerance", type=float, default=0.05)
+    parser.add_argument("--overhead-tolerance", type=float, default=0.5)
+    parser.add_argument("--overhead-floor", type=float, default=0.25,
+                        help="Overhead increase in seconds that is never flagged, for noisy CI machines")
+    args = parser.parse_args()
+
+    mode = "record" if args.command == "record" else "replay"
+    sys.path.insert(0, API_DIR)
+    prepare_environment(mode)
+    install(mode)
+
+    from benchmarks import load_sample_inputs
+    inputs = load_sample_inputs()
+    names = args.inputs.split(",") if args.inputs else list(inputs)
+
+    import main as app
+    if not app.CREWAI_AVAILABLE:
+        print("CrewAI is not installed, nothing to run")
+        sys.exit(1)
+    app.embedding_model = CassetteEncoder(app.embedding_model if mode == "record" else None)
+
+    results = {}
+    for name in names:
+        path = os.path.join(args.dir, f"{name}.json")
+        if mode == "replay" and not os.path.exists(path):
+            print(f"No cassette for {name}, record it first")
+            sys.exit(1)
+        cassette = Cassette(path, mode, latency=args.latency == "recorded")
+        results[name] = run_input(app, name, inputs[name], cassette)
+        if mode == "record":
+            cassette.save(results[name])
+    print_table(results)
+
+    baseline_path = os.path.join(args.dir, BASELINE_FILE)
+    if args.command == "replay" and args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+        print(f"Baseline saved to {baseline_path}")
+    elif args.command == "check":
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = []
+        for name, result in results.items():
+            if name in baseline:
+                problems += compare(name, baseline[name], result, args.token_tolerance,
+                                    args.overhead_tolerance, args.overhead_floor)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        sys.exit(1 if problems else 0)
@@ -0,0 +1,74 @@
+import os
+import gc
+import sys
+import logging
+
+# Production launcher: the app (and with it the embedding model) is imported once in the master
+# process and workers are forked from it, so the model weights are shared copy-on-write.
+#   python serve.py
+# Use `python main.py` for the single-process development server with auto-reload.
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", os.cpu_count() or 1))
+HOST = os.environ.get("HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", 8000))
+# Seconds a worker gets to finish in-flight crew runs after a shutdown signal
+GRACEFUL_TIMEOUT = int(os.environ.get("GRACEFUL_TIMEOUT", 300))
+# Meal plan generation can take minutes, the worker timeout has to allow for it
+WORKER_TIMEOUT = int(os.environ.get("WORKER_TIMEOUT", 600))
+# Intra-op threads torch may use per worker, so workers don't oversubscribe the cores
+TORCH_THREADS = int(os.environ.get("TORCH_THREADS", 1))
+
+
+def when_ready(server):
+    # Move everything allocated during preload into the permanent generation, so the garbage
+    # collector of a worker doesn't touch (and copy) the shared pages
+    gc.freeze()
+    logger.info(f"Model preloaded, forking {WEB_WORKERS} workers")
+
+
+def post_fork(server, worker):
+    # Only when the app loaded torch; the onnx and service embedding backends don't need it
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(TORCH_THREADS)
+
+
+try:
+    from gunicorn.app.base import BaseApplication
+
+    class MealPlannerApplication(BaseApplication):
+        def __init__(self, options: dict):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from main import app
+            return app
+
+except ImportError:
+    BaseApplication = None
+
+
+if __name__ == "__main__":
+    if BaseApplication is None:
+        logger.error("The 'gunicorn' package is not installed. Please run 'pip install gunicorn'")
+        sys.exit(1)
+
+    options = {
+        "bind": f"{HOST}:{PORT}",
+        "workers": WEB_WORKERS,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "timeout": WORKER_TIMEOUT,
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "when_ready": when_ready,
+        "post_fork": post_fork,
+    }
+    logger.info(f"Starting production server on http://{HOST}:{PORT} with {WEB_WORKERS} workers")
+    MealPlannerApplication(options).run()
@@ -0,0 +1,46 @@
+import pytest
+
+from nutrition_calculator import compute_macros, get_nutrient_table, parse_ingredient
+
+
+def parse(line):
+    table = get_nutrient_table()
+    food, grams, understood = parse_ingredient(line, table)
+    return (table.names[food] if food is not None else None), grams, understood
+
+
+@pytest.mark.parametrize("line, food", [
+    ("2 cups cooked quinoa", "cooked quinoa"),
+    ("2 cups quinoa, cooked", "cooked quinoa"),
+    ("1 cup quinoa (cooked)", "cooked quinoa"),
+    ("2 cups cooked brown rice", "cooked brown rice"),
+    ("1 lb grilled chicken breast", "cooked chicken breast"),
+    ("2 cups quinoa", "quinoa"),
+    ("1/2 cup chicken stock", "broth"),
+    ("1 cup vegetable broth", "broth"),
+    ("2 tbsp peanut butter", "peanut butter"),
+    ("14 large eggs", "eggs"),
+])
+def test_matches_food_in_its_state(line, food):
+    assert parse(line)[0] == food
+    assert parse(line)[2]
+
+
+def test_cooked_grain_uses_cooked_values():
+    macros = compute_macros({"bowl": ["2 cups cooked quinoa"]}, servings=1)["bowl"]["macros"]
+    # About 220 kcal a cup cooked, rather than the ~1250 kcal of 2 cups of dry quinoa
+    assert 400 <= macros["calories"] <= 500
+
+
+@pytest.mark.parametrize("line", [
+    "1 cup egg noodles",
+    "1 tsp garlic powder",
+    "1 lb cooked bacon",
+])
+def test_foods_the_table_cannot_represent_are_not_understood(line):
+    assert parse(line) == (None, None, False)
+
+
+def test_unrepresentable_lines_lower_coverage():
+    result = compute_macros({"soup": ["1 cup egg noodles", "1 lb chicken breast", "1 tsp garlic powder", "1 onion"]})
+    assert result["soup"]["coverage"] == 0.5
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from onnx_encoder import MIN_COSINE_SIMILARITY, ONNX_MODEL_DIR, parity
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+pytest.importorskip("sentence_transformers")
+pytestmark = pytest.mark.skipif(
+    not os.path.exists(os.path.join(ONNX_MODEL_DIR, "model_int8.onnx")),
+    reason="ONNX model not exported, run python onnx_encoder.py export",
+)
+
+QUERIES = [
+    "chicken breast, quinoa, spinach",
+    "high protein breakfast with eggs and spinach",
+    "vegan lunch with lentils and quinoa",
+    "dairy-free salmon dinner",
+    "peanut-free protein snack",
+    "Ingredients: oats, greek yogurt, berries. Dietary Restrictions: vegetarian. Daily Protein Target: 120 grams",
+]
+
+
+def test_onnx_embeddings_match_sentence_transformers():
+    assert parity(QUERIES) >= MIN_COSINE_SIMILARITY
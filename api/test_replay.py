@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+import replay
+
+requests = pytest.importorskip("requests")
+httpx = pytest.importorskip("httpx")
+from requests.adapters import BaseAdapter
+
+SUPABASE_URL = "https://example.supabase.co/rest/v1/saved_macros?username=eq.ana"
+COMPLETIONS_URL = "https://api.sambanova.ai/v1/chat/completions"
+
+
+class FakeAdapter(BaseAdapter):
+    """Answers every requests call locally, counting how often it was reached."""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        self.sent += 1
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "application/json"
+        response._content = b'[{"id": 1, "calories": 500}]'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def completion(request):
+    return httpx.Response(200, json={"choices": [{"message": {"content": "Here is your plan"}}]})
+
+
+def refuse(request):
+    raise AssertionError(f"Replay reached the transport for {request.url}")
+
+
+@pytest.fixture
+def install(monkeypatch):
+    """Install the cassette patches for one test and undo them afterwards."""
+    monkeypatch.setattr(requests.Session, "send", requests.Session.send)
+    monkeypatch.setattr(httpx.Client, "send", httpx.Client.send)
+    monkeypatch.setattr(httpx.AsyncClient, "send", httpx.AsyncClient.send)
+    monkeypatch.setattr(replay, "_active", None)
+    monkeypatch.setattr(replay, "_offline", False)
+
+    def activate(mode, cassette=None):
+        replay.install(mode)
+        replay._active = cassette
+
+    return activate
+
+
+def recorded(path, *bodies):
+    cassette = replay.Cassette(str(path), "record")
+    for body in bodies:
+        cassette.record("POST", COMPLETIONS_URL, body, 200, {}, b'{"answer": "' + body + b'"}', 0.1)
+    cassette.save({})
+    return replay.Cassette(str(path), "replay")
+
+
+def test_match_prefers_the_exact_request(tmp_path):
+    cassette = recorded(tmp_path / "run.json", b"first", b"second")
+    assert cassette.match("POST", COMPLETIONS_URL, b"second")["body"] == replay._encode_body(b'{"answer": "second"}')
+    assert cassette.match("POST", COMPLETIONS_URL, b"first")["body"] == replay._encode_body(b'{"answer": "first"}')
+    assert cassette.stats["drift"] == 0
+
+
+def test_match_falls_back_to_the_route_when_the_request_drifted(tmp_path):
+    cassette = recorded(tmp_path / "run.json", b"first", b"second")
+    assert cassette.match("POST", COMPLETIONS_URL, b"changed prompt")["body"] == replay._encode_body(b'{"answer": "first"}')
+    assert cassette.match("POST", COMPLETIONS_URL, b"second")["body"] == replay._encode_body(b'{"answer": "second"}')
+    assert cassette.stats["drift"] == 1
+
+    with pytest.raises(replay.UnrecordedRequest):
+        cassette.match("POST", COMPLETIONS_URL, b"first")
+    assert cassette.stats["unmatched"] == 1
+
+
+def test_patched_clients_replay_recorded_responses(tmp_path, install):
+    path = tmp_path / "run.json"
+    body = {"messages": [{"role": "user", "content": "Plan my week"}]}
+
+    cassette = replay.Cassette(str(path), "record")
+    install("record", cassette)
+    adapter = FakeAdapter()
+    session = requests.Session()
+    session.mount("https://", adapter)
+    assert session.get(SUPABASE_URL).json() == [{"id": 1, "calories": 500}]
+    with httpx.Client(transport=httpx.MockTransport(completion)) as client:
+        client.post(COMPLETIONS_URL, json=body)
+
+    async def post_async(transport):
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.post(COMPLETIONS_URL, json={"messages": []})
+
+    asyncio.run(post_async(httpx.MockTransport(completion)))
+    cassette.save({})
+    assert adapter.sent == 1
+    assert dict(cassette.stats["calls"]) == {"supabase": 1, "sambanova": 2}
+
+    cassette = replay.Cassette(str(path), "replay")
+    install("replay", cassette)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    assert session.get(SUPABASE_URL).json() == [{"id": 1, "calories": 500}]
+    with httpx.Client(transport=httpx.MockTransport(refuse)) as client:
+        response = client.post(COMPLETIONS_URL, json=body)
+    assert response.json()["choices"][0]["message"]["content"] == "Here is your plan"
+    assert asyncio.run(post_async(httpx.MockTransport(refuse))).status_code == 200
+    assert adapter.sent == 1
+    assert cassette.stats["drift"] == 0 and cassette.stats["unmatched"] == 0
+
+
+def test_offline_replay_refuses_traffic_outside_a_cassette(install):
+    install("replay")
+    with pytest.raises(replay.UnrecordedRequest):
+        requests.get(SUPABASE_URL)
+    with pytest.raises(replay.UnrecordedRequest):
+        httpx.get(SUPABASE_URL)
@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional
+from ltm_storage import delete_namespace
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process file locks, single-worker deployments only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Root directory under which every user gets an isolated memory namespace
+MEMORY_ROOT = os.environ.get("MEMORY_ROOT", "/long_term")
+
+# Eviction and summarisation limits (overridable through the environment)
+MEMORY_MAX_USER_BYTES = int(os.environ.get("MEMORY_MAX_USER_BYTES", 20 * 1024 * 1024))
+MEMORY_MAX_AGE_DAYS = int(os.environ.get("MEMORY_MAX_AGE_DAYS", 30))
+MEMORY_MAX_USERS = int(os.environ.get("MEMORY_MAX_USERS", 1000))
+MEMORY_RECENT_TURNS = int(os.environ.get("MEMORY_RECENT_TURNS", 4))
+# Turns a log may reach before a chat request folds it (with an LLM call); below that, folding is left
+# to the background compaction job
+MEMORY_FOLD_TURNS = int(os.environ.get("MEMORY_FOLD_TURNS", 2 * MEMORY_RECENT_TURNS))
+MEMORY_SUMMARY_MAX_CHARS = int(os.environ.get("MEMORY_SUMMARY_MAX_CHARS", 2000))
+
+TURNS_FILE = "turns.jsonl"
+SUMMARY_FILE = "summary.txt"
+MEAL_PLAN_FILE = "meal_plan.md"
+TURNS_LOCK = ".turns.lock"
+# Held shared by every crew run of the user and exclusively by a vector store reset
+VECTORS_LOCK = ".vectors.lock"
+VECTOR_STORES = ("short_term", "entity_memory")
+
+# The user whose request is currently being served; read by the crew tools
+current_user_id: ContextVar[Optional[str]] = ContextVar("current_user_id", default=None)
+
+
+def user_key(user_id: str) -> str:
+    """Return a filesystem-safe, stable namespace key for a user id."""
+    return hashlib.sha256(str(user_id).encode("utf-8")).hexdigest()[:24]
+
+
+def user_memory_dir(user_id: str) -> str:
+    """Return (and create) the memory directory of a single user."""
+    path = os.path.join(MEMORY_ROOT, "users", user_key(user_id))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _touch(path: str):
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+@contextmanager
+def _user_lock(directory: str, name: str, shared: bool = False, blocking: bool = True) -> Iterator[bool]:
+    """Hold a file lock in a user's directory across threads and worker processes.
+
+    Yields False, without the lock, when blocking is off and someone else holds it.
+    """
+    with open(os.path.join(directory, name), "a+", encoding="utf-8") as f:
+        if fcntl is not None:
+            flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            try:
+                fcntl.flock(f, flags if blocking else flags | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        yield True
+
+
+def _read_turns(directory: str) -> List[Dict]:
+    turns = []
+    path = os.path.join(directory, TURNS_FILE)
+    if not os.path.exists(path):
+        return turns
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    turns.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping corrupt memory turn in {path}")
+    return turns
+
+
+def _write_turns(directory: str, turns: List[Dict]):
+    path = os.path.join(directory, TURNS_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for turn in turns:
+            f.write(json.dumps(turn) + "\n")
+    os.replace(tmp_path, path)
+
+
+def _read_summary(directory: str) -> str:
+    path = os.path.join(directory, SUMMARY_FILE)
+    if not os.path.exists(path):
+        return ""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _write_summary(directory: str, summary: str):
+    path = os.path.join(directory, SUMMARY_FILE)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(summary[-MEMORY_SUMMARY_MAX_CHARS:])
+
+
+def record_turn(user_id: str, user_message: str, assistant_message: str):
+    """Append one conversation turn to the user's memory log."""
+    directory = user_memory_dir(user_id)
+    turn = {
+        "timestamp": time.time(),
+        "user": user_message,
+        "assistant": assistant_message,
+    }
+    with _user_lock(directory, TURNS_LOCK):
+        with open(os.path.join(directory, TURNS_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(turn) + "\n")
+    _touch(directory)
+
+
+def record_meal_plan(user_id: str, meal_plan: str):
+    """Keep the latest complete meal plan of a user, so saving it needs no LLM call."""
+    path = os.path.join(user_memory_dir(user_id), MEAL_PLAN_FILE)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(meal_plan)
+    os.replace(tmp_path, path)
+
+
+def latest_meal_plan(user_id: str) -> Optional[str]:
+    """Return the latest complete meal plan of a user, or None if none was recorded."""
+    path = os.path.join(user_memory_dir(user_id), MEAL_PLAN_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read() or None
+
+
+def default_summarizer(previous_summary: str, turns: List[Dict]) -> str:
+    """Fold old turns into the running summary without calling an LLM."""
+    lines = [previous_summary] if previous_summary else []
+    for turn in turns:
+        lines.append(f"- User asked: {turn['user'][:200]}")
+        lines.append(f"  Assistant answered: {turn['assistant'][:300]}")
+    return "\n".join(lines)
+
+
+def _fold_turns(directory: str, summarizer: Optional[Callable[[str, List[Dict]], str]] = None,
+                max_turns: int = MEMORY_RECENT_TURNS) -> int:
+    """Once the log holds more than max_turns turns, fold every turn older than the most recent
+    MEMORY_RECENT_TURNS into the summary. Returns the number folded."""
+    turns = _read_turns(directory)
+    if len(turns) <= max(max_turns, MEMORY_RECENT_TURNS):
+        return 0
+
+    old_turns, recent_turns = turns[:-MEMORY_RECENT_TURNS], turns[-MEMORY_RECENT_TURNS:]
+    previous_summary = _read_summary(directory)
+    try:
+        summary = (summarizer or default_summarizer)(previous_summary, old_turns)
+    except Exception as e:
+        logger.error(f"Error summarising memory, falling back to default summariser: {str(e)}")
+        summary = default_summarizer(previous_summary, old_turns)
+
+    # The summariser may take seconds, so it runs unlocked; the rewrite re-reads the log under the lock and
+    # keeps the turns appended meanwhile
+    with _user_lock(directory, TURNS_LOCK):
+        current = _read_turns(directory)
+        if current[:len(turns)] != turns:
+            # Another request or the compaction job folded this log first
+            return 0
+        _write_summary(directory, summary)
+        _write_turns(directory, recent_turns + current[len(turns):])
+    return len(old_turns)
+
+
+def summarize_old_turns(user_id: str, summarizer: Optional[Callable[[str, List[Dict]], str]] = None,
+                        max_turns: int = MEMORY_RECENT_TURNS) -> bool:
+    """Summarise the old turns of a user once there are more than max_turns. Returns True if anything was folded."""
+    folded = _fold_turns(user_memory_dir(user_id), summarizer, max_turns)
+    if folded:
+        logger.info(f"Folded {folded} old turns into the summary of user {user_key(user_id)}")
+    return folded > 0
+
+
+def recent_context(user_id: str) -> str:
+    """Return the summary plus recent turns of a user, bounded by MEMORY_RECENT_TURNS."""
+    directory = user_memory_dir(user_id)
+    summary = _read_summary(directory)
+    turns = _read_turns(directory)
+    if len(turns) > MEMORY_RECENT_TURNS:
+        # Turns not folded yet are shown in the short form of the default summariser
+        summary = default_summarizer(summary, turns[:-MEMORY_RECENT_TURNS])
+        turns = turns[-MEMORY_RECENT_TURNS:]
+    if not summary and not turns:
+        return ""
+
+    parts = []
+    if summary:
+        parts.append(f"Summary of earlier conversation:\n{summary}")
+    if turns:
+        recent = "\n".join(f"User: {turn['user']}\nAssistant: {turn['assistant']}" for turn in turns)
+        parts.append(f"Most recent conversation:\n{recent}")
+    return "\n\n".join(parts)
+
+
+@contextmanager
+def vector_memory_in_use(user_id: str) -> Iterator[None]:
+    """Mark the user's vector stores as open by a crew run, so no reset drops them underneath it."""
+    with _user_lock(user_memory_dir(user_id), VECTORS_LOCK, shared=True):
+        yield
+
+
+def _reset_vectors(directory: str, reset_stores: Optional[Callable[[str], None]] = None) -> bool:
+    """Reset the short-term and entity stores in a user directory unless a crew run has them open.
+
+    reset_stores resets them through their storage, which also clears any client cached on them; without
+    it the directories are removed. Returns True if the stores were reset.
+    """
+    with _user_lock(directory, VECTORS_LOCK, blocking=False) as held:
+        if not held:
+            logger.info(f"Vector memory in {directory} is in use, leaving the reset to a later turn")
+            return False
+        try:
+            if reset_stores is not None:
+                reset_stores(directory)
+            else:
+                for sub in VECTOR_STORES:
+                    shutil.rmtree(os.path.join(directory, sub), ignore_errors=True)
+        except Exception as e:
+            logger.error(f"Error resetting vector memory in {directory}: {str(e)}")
+            return False
+    return True
+
+
+def reset_vector_memory(user_id: str, reset_stores: Optional[Callable[[str], None]] = None) -> bool:
+    """Drop the user's short-term and entity vector stores, keeping the turn log and summary."""
+    return _reset_vectors(user_memory_dir(user_id), reset_stores)
+
+
+def enforce_user_budget(user_id: str, summarizer: Optional[Callable[[str, List[Dict]], str]] = None,
+                        reset_stores: Optional[Callable[[str], None]] = None):
+    """Summarise old turns past MEMORY_FOLD_TURNS and reset the vector stores past the size budget.
+
+    Runs after every chat turn, so the summariser (an LLM call) only runs every few turns.
+    """
+    summarize_old_turns(user_id, summarizer, MEMORY_FOLD_TURNS)
+    directory = user_memory_dir(user_id)
+    size = _dir_size(directory)
+    if size > MEMORY_MAX_USER_BYTES:
+        logger.info(f"Memory of user {user_key(user_id)} is {size} bytes, resetting vector stores")
+        reset_vector_memory(user_id, reset_stores)
+
+
+def _evict(key: str, path: str) -> bool:
+    with _user_lock(path, VECTORS_LOCK, blocking=False) as held:
+        if not held:
+            # Idle by its mtime, but a crew run is using it right now
+            return False
+        shutil.rmtree(path, ignore_errors=True)
+    delete_namespace(key)
+    return True
+
+
+def compact_all(summarizer: Optional[Callable[[str, List[Dict]], str]] = None,
+                reset_stores: Optional[Callable[[str], None]] = None) -> Dict[str, int]:
+    """Evict idle users, cap the number of stored users and bound the size of the rest."""
+    users_root = os.path.join(MEMORY_ROOT, "users")
+    stats = {"evicted": 0, "compacted": 0, "remaining": 0}
+    if not os.path.isdir(users_root):
+        return stats
+
+    cutoff = time.time() - MEMORY_MAX_AGE_DAYS * 86400
+    entries = []
+    for key in os.listdir(users_root):
+        path = os.path.join(users_root, key)
+        if not os.path.isdir(path):
+            continue
+        mtime = os.path.getmtime(path)
+        if mtime < cutoff and _evict(key, path):
+            stats["evicted"] += 1
+        else:
+            entries.append((mtime, key, path))
+
+    # Least recently used users go first once the cap is exceeded
+    entries.sort(reverse=True)
+    kept = entries[:MEMORY_MAX_USERS]
+    for entry in entries[MEMORY_MAX_USERS:]:
+        if _evict(entry[1], entry[2]):
+            stats["evicted"] += 1
+        else:
+            kept.append(entry)
+    entries = kept
+
+    for _, key, path in entries:
+        if _fold_turns(path, summarizer):
+            stats["compacted"] += 1
+        if _dir_size(path) > MEMORY_MAX_USER_BYTES and _reset_vectors(path, reset_stores):
+            stats["compacted"] += 1
+
+    stats["remaining"] = len(entries)
+    logger.info(f"Memory compaction finished: {stats}")
+    return stats
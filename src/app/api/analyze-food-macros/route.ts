@@ -15,7 +15,17 @@ export async function POST(req: NextRequest) {
       });
       
       if (!response.ok) {
-        throw new Error(`API returned status code ${response.status}`);
+        // The API answered but had no estimate; don't turn that into zeros that look like real data
+        const errorText = await response.text();
+        console.error(`API error (${response.status}): ${errorText}`);
+        let detail = "Failed to analyze food image";
+        try {
+          detail = JSON.parse(errorText).detail || detail;
+        } catch {}
+        return NextResponse.json(
+          { success: false, error: detail },
+          { status: response.status }
+        );
       }
       
       const data = await response.json();
@@ -26,16 +26,22 @@ export async function GET(
     }
 
     const url = new URL(req.url);
-    const date = url.searchParams.get("date");
     
     // Forward the request to the Python API
     const apiUrl = process.env.API_URL || "http://127.0.0.1:8000";
     
+    // Pass through the date filter, pagination (limit, cursor) and field projection
     const queryParams = new URLSearchParams();
-    if (date) {
-      queryParams.append("date", date);
+    for (const key of ["date", "limit", "cursor", "fields"]) {
+      const value = url.searchParams.get(key);
+      if (value) {
+        queryParams.append(key, value);
+      }
     }
     
+    // Forward conditional GETs so unchanged data comes back as 304
+    const ifNoneMatch = req.headers.get("if-none-match");
+    
     console.log(`Fetching macros for user ${username} from ${apiUrl}/get-user-macros/${username}`);
     
     try {
@@ -45,10 +51,19 @@ export async function GET(
           method: "GET",
           headers: {
             "Content-Type": "application/json",
+            ...(ifNoneMatch ? { "If-None-Match": ifNoneMatch } : {}),
           },
         }
       );
       
+      const etag = response.headers.get("etag");
+      if (response.status === 304) {
+        return new NextResponse(null, {
+          status: 304,
+          headers: etag ? { ETag: etag } : {},
+        });
+      }
+      
       if (!response.ok) {
         const errorText = await response.text();
         console.error(`Error from Python API: ${response.status} - ${errorText}`);
@@ -61,7 +76,9 @@ export async function GET(
       }
       
       const data = await response.json();
-      return NextResponse.json(data);
+      return NextResponse.json(data, {
+        headers: etag ? { ETag: etag, "Cache-Control": "private, no-cache" } : {},
+      });
     } catch (fetchError) {
       console.error("Error connecting to FastAPI backend:", fetchError);
       
@@ -66,6 +66,10 @@ export async function POST(request: NextRequest) {
         // Create a new FormData object to send to the FastAPI server
         const apiFormData = new FormData();
         apiFormData.append("file", file);
+        const userId = formData.get("user_id");
+        if (typeof userId === "string" && userId) {
+          apiFormData.append("user_id", userId);
+        }
         
         // Call the FastAPI endpoint
         console.log(`Calling FastAPI service at ${FASTAPI_URL}/identify-ingredients`);
@@ -0,0 +1,37 @@
+import { NextRequest, NextResponse } from "next/server";
+
+// Define the base URL for our API server
+const API_BASE_URL = process.env.API_BASE_URL || "http://127.0.0.1:8000";
+
+export async function POST(req: NextRequest) {
+  try {
+    const body = await req.json();
+    
+    // Forward the request to our FastAPI backend
+    const response = await fetch(`${API_BASE_URL}/prefetch-recipes`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(body),
+    });
+
+    if (!response.ok) {
+      const errorData = await response.text();
+      console.error('Error from FastAPI server:', errorData);
+      return NextResponse.json(
+        { error: 'Failed to start recipe prefetch', details: errorData },
+        { status: response.status }
+      );
+    }
+
+    const data = await response.json();
+    return NextResponse.json(data);
+  } catch (error: any) {
+    console.error('Error in prefetch-recipes route:', error);
+    return NextResponse.json(
+      { error: 'Internal server error', details: error.message },
+      { status: 500 }
+    );
+  }
+}
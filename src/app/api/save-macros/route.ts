@@ -30,11 +30,17 @@ export async function POST(req: NextRequest) {
     
     try {
       console.log(`Sending request to ${apiUrl}/save-macros`);
+      const headers: Record<string, string> = {
+        "Content-Type": "application/json",
+      };
+      // Let retried saves be de-duplicated by the API
+      const idempotencyKey = req.headers.get("Idempotency-Key");
+      if (idempotencyKey) {
+        headers["Idempotency-Key"] = idempotencyKey;
+      }
       const response = await fetch(`${apiUrl}/save-macros`, {
         method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-        },
+        headers,
         body: JSON.stringify(sanitizedData),
       });
       
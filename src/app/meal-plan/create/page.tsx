@@ -104,6 +104,21 @@ export default function CreateMealPlanPage() {
     
     localStorage.setItem("mealPlanData", JSON.stringify(mealPlanData));
     
+    // Start the recipe search while the chat page loads; the meal plan works without it
+    if (userId) {
+      fetch("/api/prefetch-recipes", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          user_id: userId,
+          ingredients: allIngredients,
+          dietaryRestrictions: dietaryPreferences,
+          allergies,
+          proteinTarget,
+        }),
+      }).catch((error) => console.error("Error prefetching recipes:", error));
+    }
+    
     // Redirect to the chat page with query parameters
     const params = new URLSearchParams();
     params.set("ingredients", allIngredients.join(","));
@@ -242,7 +242,8 @@ export default function NutritionTrackerPage() {
       });
       
       if (!response.ok) {
-        throw new Error('Failed to analyze image');
+        const errorData = await response.json().catch(() => ({}));
+        throw new Error(errorData.error || 'Failed to analyze image');
       }
       
       const data = await response.json();
@@ -264,7 +265,7 @@ export default function NutritionTrackerPage() {
       }
     } catch (error) {
       console.error('Error analyzing image:', error);
-      toast.error('Failed to analyze image');
+      toast.error(error instanceof Error ? error.message : 'Failed to analyze image');
     } finally {
       setIsAnalyzing(false);
     }
@@ -80,6 +80,11 @@ export default function IngredientsUploader({
     try {
       const formData = new FormData();
       formData.append('file', file);
+      // Lets the API start looking up recipes for the ingredients it finds
+      const userId = localStorage.getItem('mealplan_user_id');
+      if (userId) {
+        formData.append('user_id', userId);
+      }
       
       const response = await fetch('/api/identify-ingredients', {
         method: 'POST',